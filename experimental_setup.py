@@ -1,6 +1,8 @@
 import time
 import random
 import os
+import threading
+import numpy as np
 import pandas as pd
 import pickle
 from functools import partial
@@ -10,10 +12,82 @@ from imblearn.under_sampling import RandomUnderSampler
 from sklearn.model_selection import StratifiedKFold
 
 import utils
+import instrumentation
 # modify for merged ga/nsga
-from ga import GA
-
-def compare_reweighting_methods(ml_models, experiments, task_id_lists, base_save_folder, data_dir, num_runs, objective_functions, objective_functions_weights , ga_params):
+from ga import GA, FitnessCache, IslandModel
+
+def touch_heartbeat(save_folder):
+    """Marks the run in save_folder as alive; see is_stale_partial_run."""
+    with open(f"{save_folder}/heartbeat", "w") as f:
+        f.write(str(time.time()))
+
+class Heartbeat:
+
+    def __init__(self, save_folder, interval=300):
+        """
+        Touches the heartbeat of save_folder every interval seconds from a daemon thread
+        between start() and stop(), so a run stays alive for is_stale_partial_run even while
+        nothing else in save_folder changes (e.g. GA modes without checkpoints).
+        """
+        self.save_folder = save_folder
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            touch_heartbeat(self.save_folder)
+
+    def start(self):
+        touch_heartbeat(self.save_folder)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+def is_stale_partial_run(save_folder, stale_after):
+    """
+    True if the run in save_folder has neither finished nor failed and nothing in it
+    (heartbeat, GA checkpoint) was modified for stale_after seconds, i.e. its job was preempted.
+    """
+    if stale_after is None:
+        return False
+    if os.path.exists(f"{save_folder}/scores.pkl") or os.path.exists(f"{save_folder}/failed.pkl"):
+        return False
+    last_modified = os.path.getmtime(save_folder)
+    for dirpath, _, filenames in os.walk(save_folder):
+        for filename in filenames:
+            last_modified = max(last_modified, os.path.getmtime(os.path.join(dirpath, filename)))
+    return time.time() - last_modified > stale_after
+
+def compare_reweighting_methods(ml_models, experiments, task_id_lists, base_save_folder, data_dir, num_runs, objective_functions, objective_functions_weights , ga_params, n_jobs=1, cache_dir=None, stale_after=6*3600, racing_min_folds=None, profile=False, n_islands=1, migration_interval=5, refit='all', executor_backend='thread'):
+    # n_jobs > 1 runs work concurrently on a pool of that many workers: the individuals of each
+    # GA population for 'Evolved Weights', the cross-validation folds for the other experiments.
+    # executor_backend: 'thread' or 'process' pool, see utils.make_executor; a process pool is
+    # built per run, its workers load the run's folds once
+    # cache_dir, if given, keeps preprocessed train/test splits on disk across runs and workers
+    # stale_after: seconds without a heartbeat after which an unfinished run is taken over and
+    # resumed from its GA checkpoint (None never takes over a run)
+    # racing_min_folds: if given, 'Evolved Weights' races the CV folds (utils.RacingEvaluator) and
+    # stops scoring offspring dominated by the current front after at least this many folds
+    # profile: time the phases of every run into {save_folder}/timings.jsonl and print a
+    # summary table at its end (see instrumentation)
+    # n_islands > 1 runs 'Evolved Weights' as that many GA islands in separate processes that
+    # exchange first-front individuals every migration_interval generations (see ga.IslandModel);
+    # the islands split pop_size, and n_jobs threads, among them and runs are not checkpointed
+    # refit: 'all' refits and scores every evaluated individual of 'Evolved Weights'; 'front' only
+    # the ones on the cross-validated Pareto front, as tracked online by the GA (ga.ParetoArchive)
+    if refit not in ('all', 'front'):
+        raise ValueError(f"refit={refit} must be 'all' or 'front'")
     for m, ml in enumerate(ml_models):
         for t, taskid in enumerate(task_id_lists):
             for r in range(num_runs):
@@ -25,8 +99,13 @@ def compare_reweighting_methods(ml_models, experiments, task_id_lists, base_save
                     time.sleep(random.random()*5)
                     if not os.path.exists(save_folder):
                         os.makedirs(save_folder)
+                    elif is_stale_partial_run(save_folder, stale_after):
+                        print("resuming preempted run")
                     else:
                         continue
+                    touch_heartbeat(save_folder)
+                    if profile:
+                        instrumentation.enable(f"{save_folder}/timings.jsonl", task=taskid, exp=exp, run=r, model=model_name)
 
                     print("working on ")
                     print(save_folder)
@@ -42,7 +121,8 @@ def compare_reweighting_methods(ml_models, experiments, task_id_lists, base_save
                         dataset_name = taskid
                     
                     # Split the data into training_validation and testing sets
-                    X_train, y_train, X_test, y_test, features, sens_features = utils.load_task(data_dir, dataset_name, test_size=0.2, seed=r)
+                    with instrumentation.timer('data.load'):
+                        X_train, y_train, X_test, y_test, features, sens_features = utils.load_task(data_dir, dataset_name, test_size=0.2, seed=r, cache_dir=cache_dir)
 
                     if taskid.startswith('pmad_rus'):
                         #Random undersampling because of extreme class imbalance
@@ -50,10 +130,19 @@ def compare_reweighting_methods(ml_models, experiments, task_id_lists, base_save
                         X_train, y_train = rus.fit_resample(X_train, y_train)
                     
                     skf = StratifiedKFold(n_splits=10, random_state=r, shuffle=True)
+                    # folds are fixed for the whole run, so materialize them once
+                    with instrumentation.timer('data.folds'):
+                        fold_cache = utils.FoldCache(skf, X_train, y_train, sens_features)
 
                     print("starting ml")
+                    # keep the run alive for other workers until it ends, checkpoints or not
+                    heartbeat = Heartbeat(save_folder, 300 if stale_after is None else min(300, stale_after / 4)).start()
+                    executor = None
                                     
                     try:  
+                        # island runs evaluate on their own threads, see n_jobs_per_island
+                        if n_jobs > 1 and not (exp == 'Evolved Weights' and n_islands > 1):
+                            executor = utils.make_executor(n_jobs, executor_backend, fold_cache)
                         print("Starting the fitting process. ")
                         
                         # condense repeating parts
@@ -67,24 +156,24 @@ def compare_reweighting_methods(ml_models, experiments, task_id_lists, base_save
                                 weights = utils.calc_weights(X_train, y_train, sens_features)
 
                             for i in range(num_evals):
+                                touch_heartbeat(save_folder)
                                 this_seed = super_seed + i
                                 est = ml(random_state=this_seed)
 
-                                cv_vals = utils.cross_val_scorer(None, skf, est, X_train, y_train, sens_features, objective_functions)
+                                with instrumentation.timer('cv.score'):
+                                    cv_vals = utils.cross_val_scorer(None, skf, est, X_train, y_train, sens_features, objective_functions, fold_cache=fold_cache, executor=executor)
                                 cv_score = {objective_functions[k]: cv_vals[k] for k in range(len(objective_functions))}
                                 # Fit model (with or without weights)
-                                if weights is None:
-                                    est.fit(X_train, y_train)
-                                else:
-                                    est.fit(X_train, y_train, weights)
-
-                                print("Ending the fitting process.")
+                                with instrumentation.timer('model.fit'):
+                                    if weights is None:
+                                        est.fit(X_train, y_train)
+                                    else:
+                                        est.fit(X_train, y_train, weights)
 
                                 # Evaluate scores
-                                train_score = utils.evaluate_objective_functions(est, X_train, y_train, objective_functions, sens_features)
-                                test_score = utils.evaluate_objective_functions(est, X_test, y_test, objective_functions, sens_features)
-
-                                print("Ending the scoring process.")
+                                with instrumentation.timer('final.score'):
+                                    train_score = utils.evaluate_objective_functions(est, X_train, y_train, objective_functions, sens_features)
+                                    test_score = utils.evaluate_objective_functions(est, X_test, y_test, objective_functions, sens_features)
 
                                 # Add results to the DataFrame
                                 this_score = {}
@@ -105,39 +194,78 @@ def compare_reweighting_methods(ml_models, experiments, task_id_lists, base_save
                             return
                         
                         elif exp == 'Evolved Weights':
-                            scores = pd.DataFrame(columns = ['taskid','exp_name','seed', 'run', *objective_functions, *['train_'+k for k in objective_functions]])
-                            ga_func = partial(utils.fitness_func_kfold, skf=skf, model = ml(random_state=super_seed), X_train=X_train, y_train=y_train,
-                                              sens_features=sens_features, objective_functions=objective_functions, objective_functions_weights=objective_functions_weights)
-                            ga_func.__name__ = 'ga_func'
+                            scores = pd.DataFrame(columns = ['taskid','exp_name','seed', 'run', *objective_functions, *['train_'+k for k in objective_functions],
+                                                             'cv_fidelity', 'stopped_generation', 'saved_evaluations'])
+                            # (group, label) cell of each training row; fixed for the whole run
+                            cell_idx = fold_cache.cell_idx
+                            if racing_min_folds is None:
+                                # the folds and cells come from fold_cache; leaving out X_train and y_train keeps
+                                # the partial small when it is shipped to process pool workers
+                                ga_func = partial(utils.fitness_func_kfold, skf=skf, model = ml(random_state=super_seed), X_train=None, y_train=None,
+                                                  sens_features=sens_features, objective_functions=objective_functions, objective_functions_weights=objective_functions_weights,
+                                                  fold_cache=fold_cache)
+                                ga_func.__name__ = 'ga_func'
+                            else:
+                                ga_func = utils.RacingEvaluator(ml(random_state=super_seed), fold_cache, sens_features, objective_functions,
+                                                                objective_functions_weights, min_folds=racing_min_folds)
                             
-                            # Run GA
-                            ga = GA(
-                                ind_size=2**(len(sens_features) + 1),
-                                random_state=super_seed,
-                                fitness_func=ga_func,
-                                use_nsga=True,
-                                **ga_params
-                            )
-
-                            ga.optimize()
-
-                            for j in range(ga.evaluated_individuals.shape[0]):
+                            # Run GA; children that only differ from an evaluated genome in empty
+                            # (group, label) cells reuse its fitness instead of re-running the CV
+                            ind_size = 2**(len(sens_features) + 1)
+                            fitness_cache = FitnessCache(present_cells=np.bincount(cell_idx, minlength=ind_size) > 0)
+                            # hypervolumes relative to compute_hv's reference point (1, 1) in (1 - perf, fair)
+                            # space, i.e. perf 0 and fair 1, in the GA's weighted maximization space
+                            ga_params = {'hv_ref': np.multiply([0, 1], objective_functions_weights), **ga_params}
+                            if n_islands > 1:
+                                # the islands share the evaluation budget of a single GA: each evolves
+                                # pop_size // n_islands individuals for max_gens generations
+                                island_params = {**ga_params, 'pop_size': max(2, ga_params['pop_size'] // n_islands)}
+                                ga = IslandModel(
+                                    n_islands=n_islands,
+                                    migration_interval=migration_interval,
+                                    random_state=super_seed,
+                                    n_jobs_per_island=max(1, n_jobs // n_islands),
+                                    ind_size=ind_size,
+                                    fitness_func=ga_func,
+                                    use_nsga=True,
+                                    fitness_cache=fitness_cache,
+                                    **island_params
+                                )
+                            else:
+                                ga = GA(
+                                    ind_size=ind_size,
+                                    random_state=super_seed,
+                                    fitness_func=ga_func,
+                                    use_nsga=True,
+                                    executor=executor,
+                                    fitness_cache=fitness_cache,
+                                    # steady-state runs cannot be checkpointed; the heartbeat still keeps them alive
+                                    checkpoint_dir=None if ga_params.get('steady_state', False) else f"{save_folder}/checkpoint",
+                                    **ga_params
+                                )
+
+                            with instrumentation.timer('ga.optimize'):
+                                ga.optimize()
+                            evaluated_individuals = ga.evaluated_individuals
+                            refit_rows = ga.pareto_rows() if refit == 'front' else range(evaluated_individuals.shape[0])
+
+                            for j in refit_rows:
+                                touch_heartbeat(save_folder)
                                 est = ml(random_state=super_seed)
-                                weights = utils.partial_to_full_sample_weight(ga.evaluated_individuals.loc[j,'individual'], X_train, y_train, sens_features)
-                                est.fit(X_train, y_train, weights)
-                                print("Ending the fitting process. ")
+                                weights = utils.partial_to_full_sample_weight(evaluated_individuals.loc[j,'individual'], X_train, y_train, sens_features, cell_idx)
+                                with instrumentation.timer('model.fit'):
+                                    est.fit(X_train, y_train, weights)
 
                                 # Getting already computed cv scores; making sure to weight them properly
-                                cv_score = {objective_functions[0]: ga.evaluated_individuals.loc[j,'perf_fitness']*objective_functions_weights[0],
-                                            objective_functions[1]: ga.evaluated_individuals.loc[j,'fair_fitness']*objective_functions_weights[1]}
+                                cv_score = {objective_functions[0]: evaluated_individuals.loc[j,'perf_fitness']*objective_functions_weights[0],
+                                            objective_functions[1]: evaluated_individuals.loc[j,'fair_fitness']*objective_functions_weights[1]}
                                 
                                 # Make sure both scores are positive
                                 assert (cv_score[objective_functions[0]] >= 0) and (cv_score[objective_functions[1]] >= 0), "One of the cross-validated scores is negative!"
 
-                                train_score = utils.evaluate_objective_functions(est, X_train, y_train, objective_functions,sens_features)
-                                test_score = utils.evaluate_objective_functions(est, X_test, y_test, objective_functions, sens_features)
-
-                                print("Ending the scoring process. ")
+                                with instrumentation.timer('final.score'):
+                                    train_score = utils.evaluate_objective_functions(est, X_train, y_train, objective_functions,sens_features)
+                                    test_score = utils.evaluate_objective_functions(est, X_test, y_test, objective_functions, sens_features)
 
                                 this_score = {}
                                 train_score = {f"train_{k}": v for k, v in train_score.items()}
@@ -145,6 +273,9 @@ def compare_reweighting_methods(ml_models, experiments, task_id_lists, base_save
                                 this_score.update(train_score)
                                 this_score.update(cv_score)
                                 this_score.update(test_score)
+                                this_score["cv_fidelity"] = evaluated_individuals.loc[j,'fidelity']
+                                this_score["stopped_generation"] = ga.stopped_generation
+                                this_score["saved_evaluations"] = ga.saved_evaluations
 
                                 this_score["exp_conditions"] = {"this_task": taskid, "this_exp": exp, "this_seed": super_seed, "this_run":r, "total_runs": num_runs, "objective_functions": objective_functions, 
                                                                 "objective_functions_weights": objective_functions_weights, "ga_params": ga_params}
@@ -172,5 +303,12 @@ def compare_reweighting_methods(ml_models, experiments, task_id_lists, base_save
                             pickle.dump(pipeline_failure_dict, f)
 
                         return
+
+                    finally:
+                        if executor is not None:
+                            executor.shutdown()
+                        heartbeat.stop()
+                        # writes the summary record and prints the table; no-op without profile
+                        instrumentation.disable()
         
     print("all finished")
@@ -1,16 +1,448 @@
 import numpy as np
+import collections
+import concurrent.futures
+import bisect
 import copy
+import multiprocessing
+import queue
+import traceback
+import os
+import time
+import pickle
+import tempfile
 import pandas as pd
 import nsga2 as nsga
+import instrumentation
+from sklearn.ensemble import RandomForestRegressor
+
+def epsilon_lexicase_pool(fitness, order):
+    """
+    Indices of the rows of a (pop, n_obj) fitness matrix that survive automatic epsilon
+    lexicase filtering with the cases in order. Each case keeps the candidates within one
+    median absolute deviation (of the remaining candidates) of the best, maximizing.
+    """
+    pool = np.arange(len(fitness))
+    for case in order:
+        if len(pool) <= 1:
+            break
+        errors_for_this_case = fitness[pool, case]
+        median_val = np.median(errors_for_this_case)
+        median_absolute_deviation = np.median(np.abs(errors_for_this_case - median_val))
+        pool = pool[errors_for_this_case >= errors_for_this_case.max() - median_absolute_deviation]
+    return pool
+
+
+def epsilon_lexicase_select(fitness, n_parents, rng):
+    """
+    Draws n_parents row indices of a (pop, n_obj) fitness matrix by automatic epsilon
+    lexicase selection, with the same distribution as n_parents calls of GA.selection.
+
+    The surviving pool only depends on the order of the cases, so it is filtered once per
+    distinct order drawn (at most n_obj! of them) and all parents are then drawn from their
+    order's pool in one batch.
+    """
+    fitness = np.asarray(fitness, dtype=float)
+    n_obj = fitness.shape[1]
+    orders = rng.permuted(np.tile(np.arange(n_obj), (n_parents, 1)), axis=1)
+    distinct_orders, order_ids = np.unique(orders, axis=0, return_inverse=True)
+    order_ids = order_ids.reshape(-1)
+    pools = [epsilon_lexicase_pool(fitness, order) for order in distinct_orders]
+
+    pool_sizes = np.array([len(pool) for pool in pools])
+    picks = rng.integers(0, pool_sizes[order_ids])
+    # flatten the pools so every draw is a single fancy-indexing lookup
+    offsets = np.concatenate(([0], np.cumsum(pool_sizes)[:-1]))
+    return np.concatenate(pools)[offsets[order_ids] + picks]
+
 
 class Individual:
 
-    def __init__(self, program, fitness):
+    def __init__(self, program, fitness, fidelity=1.0):
         self.program = np.array(program)
         self.fitness = fitness
+        self.fidelity = fidelity
+
+class Archive:
+
+    def __init__(self, ind_size, objective_names=('perf_fitness', 'fair_fitness'), capacity=1024):
+        """
+        Preallocated, growable columnar archive of every evaluated individual.
+
+        Genomes are rows of a float64 matrix and each objective, the generation, the
+        evaluation timestamp and the fidelity (fraction of CV folds scored) are separate
+        arrays. Capacity doubles when full, so appending is amortized O(1).
+
+        Parameters
+        ----------
+        ind_size : int
+            Number of variables in an individual.
+        objective_names : sequence of str, optional
+            Column names of the objectives, in fitness order.
+        capacity : int, optional
+            Initial number of preallocated rows.
+        """
+        self.ind_size = ind_size
+        self.objective_names = list(objective_names)
+        self.size = 0
+        self.genomes = np.empty((capacity, ind_size), dtype=np.float64)
+        self.objectives = np.empty((capacity, len(self.objective_names)), dtype=np.float64)
+        self.generation = np.empty(capacity, dtype=np.int64)
+        self.timestamp = np.empty(capacity, dtype=np.float64)
+        self.fidelity = np.empty(capacity, dtype=np.float64)
+        self._frame = None
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, min_capacity):
+        capacity = max(min_capacity, 2 * len(self.genomes))
+        for name in ('genomes', 'objectives', 'generation', 'timestamp', 'fidelity'):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def append(self, programs, fitness, generation, timestamp=None, fidelity=1.0):
+        """Adds a (k, ind_size) genome matrix and its (k, n_obj) fitness array."""
+        programs = np.atleast_2d(np.asarray(programs, dtype=np.float64))
+        fitness = np.atleast_2d(np.asarray(fitness, dtype=np.float64))
+        assert programs.shape[0] == fitness.shape[0], "Need one fitness row per program."
+        assert fitness.shape[1] == len(self.objective_names), "Number of objectives does not match the archive."
+
+        k = programs.shape[0]
+        if self.size + k > len(self.genomes):
+            self._grow(self.size + k)
+        rows = slice(self.size, self.size + k)
+        self.genomes[rows] = programs
+        self.objectives[rows] = fitness
+        self.generation[rows] = generation
+        self.timestamp[rows] = time.time() if timestamp is None else timestamp
+        self.fidelity[rows] = fidelity
+        self.size += k
+        self._frame = None
+
+    def to_frame(self):
+        """
+        DataFrame view with an 'individual' column of genomes, one column per objective,
+        'generation', 'timestamp' and 'fidelity'. Cached until the next append.
+        """
+        if self._frame is None:
+            frame = pd.DataFrame({'individual': list(self.genomes[:self.size].copy())})
+            for j, name in enumerate(self.objective_names):
+                frame[name] = self.objectives[:self.size, j]
+            frame['generation'] = self.generation[:self.size]
+            frame['timestamp'] = self.timestamp[:self.size]
+            frame['fidelity'] = self.fidelity[:self.size]
+            self._frame = frame
+        return self._frame
+
+    def export(self, folder, chunk_size=1000, start=0):
+        """
+        Writes rows [start, len) to folder as numbered .npz chunks of at most chunk_size rows,
+        e.g. export(folder, start=rows_already_exported) after every few generations.
+        Returns the number of rows in the archive, i.e. the next start.
+        """
+        os.makedirs(folder, exist_ok=True)
+        for begin in range(start, self.size, chunk_size):
+            end = min(begin + chunk_size, self.size)
+            np.savez(os.path.join(folder, f"archive_{begin:09d}.npz"),
+                     genomes=self.genomes[begin:end], objectives=self.objectives[begin:end],
+                     generation=self.generation[begin:end], timestamp=self.timestamp[begin:end],
+                     fidelity=self.fidelity[begin:end], objective_names=np.array(self.objective_names))
+        return self.size
+
+    @classmethod
+    def load(cls, folder):
+        """Rebuilds an archive from the chunks written by export."""
+        chunks = sorted(f for f in os.listdir(folder) if f.startswith('archive_') and f.endswith('.npz'))
+        assert len(chunks) > 0, f"No archive chunks found in {folder}"
+        data = [np.load(os.path.join(folder, f)) for f in chunks]
+        archive = cls(data[0]['genomes'].shape[1], [str(n) for n in data[0]['objective_names']],
+                      capacity=max(1, sum(len(d['genomes']) for d in data)))
+        for d in data:
+            archive.append(d['genomes'], d['objectives'], d['generation'], d['timestamp'],
+                           d['fidelity'] if 'fidelity' in d.files else 1.0)
+        return archive
+
+
+class ParetoArchive:
+
+    def __init__(self, ref=None):
+        """
+        Online non-dominated set of two maximized objectives with its exact hypervolume.
+
+        Front points are kept in parallel lists sorted by increasing first objective, so the
+        second objective strictly decreases. Inserting finds the position by bisection
+        (O(log n)); the points a new one dominates are a contiguous run next to it and are
+        pruned, and the hypervolume is updated from the few staircase terms that change.
+        Ties keep the earliest point.
+
+        Parameters
+        ----------
+        ref : array-like, optional
+            Reference point of the hypervolume, see nsga2.hypervolume. hypervolume is None
+            until it is set, e.g. later with set_ref.
+        """
+        self.first = []
+        self.second = []
+        self.rows = []
+        self.ref = None
+        self.hypervolume = None
+        self.n_inserted = 0
+        if ref is not None:
+            self.set_ref(ref)
+
+    def __len__(self):
+        return len(self.first)
+
+    def _term(self, i):
+        # area of the staircase step of point i, clipped to the reference point
+        left = self.ref[0] if i == 0 else max(self.first[i - 1], self.ref[0])
+        return (max(self.first[i], self.ref[0]) - left) * (max(self.second[i], self.ref[1]) - self.ref[1])
+
+    def _window(self, begin, end):
+        return sum(self._term(i) for i in range(begin, min(end, len(self.first))))
+
+    def set_ref(self, ref):
+        """Sets the reference point and recomputes the hypervolume of the current front."""
+        self.ref = tuple(float(v) for v in ref)
+        assert len(self.ref) == 2, "ParetoArchive supports two objectives."
+        self.hypervolume = self._window(0, len(self.first))
+
+    def insert(self, first, second, row=None):
+        """Adds one point (with its archive row); returns True if it joined the front."""
+        first, second = float(first), float(second)
+        self.n_inserted += 1
+        if np.isnan(first) or np.isnan(second):
+            return False
+
+        # the point with the smallest first objective >= first has the best second objective among them
+        i = bisect.bisect_left(self.first, first)
+        if i < len(self.first) and self.second[i] >= second:
+            # dominated by, or a duplicate of, that point
+            return False
+
+        # pruned run [j, end): an equal first objective with a worse second, and the
+        # points to the left whose second objective is not better
+        end = i + 1 if i < len(self.first) and self.first[i] == first else i
+        j = i
+        while j > 0 and self.second[j - 1] <= second:
+            j -= 1
+
+        # the terms of the pruned points and of the right neighbor change
+        if self.ref is not None:
+            old = self._window(j, end + 1)
+        self.first[j:end] = [first]
+        self.second[j:end] = [second]
+        self.rows[j:end] = [row]
+        if self.ref is not None:
+            self.hypervolume += self._window(j, j + 2) - old
+        return True
+
+    def extend(self, fitness, rows=None):
+        """Inserts the rows of a (k, 2) fitness array; returns how many joined the front."""
+        fitness = np.asarray(fitness, dtype=float).reshape(-1, 2)
+        rows = [None] * len(fitness) if rows is None else rows
+        return sum(self.insert(f[0], f[1], row) for f, row in zip(fitness.tolist(), rows))
+
+    def front(self):
+        """(k, 2) array of the front, by increasing first objective."""
+        return np.column_stack([self.first, self.second]) if len(self.first) > 0 else np.empty((0, 2))
+
+
+class FitnessCache:
+
+    def __init__(self, maxsize=4096, present_cells=None, decimals=None, scale_invariant=False):
+        """
+        Bounded LRU cache of fitness values keyed on a canonicalized genome.
+
+        A genome is canonicalized by keeping only the (group, label) cells that occur in the
+        training data, since the weights of empty cells are never used, then optionally
+        normalizing it to unit sum and rounding it. With the defaults the cache is exact:
+        a hit returns the value the fitness function would have computed.
+
+        Parameters
+        ----------
+        maxsize : int, optional
+            Maximum number of cached genomes; least recently used ones are evicted first.
+        present_cells : array-like of bool, optional
+            Mask over the genome of cells present in the training data, e.g.
+            np.bincount(utils.cell_index(X, y, sens_features), minlength=ind_size) > 0.
+            All cells are kept if None.
+        decimals : int, optional
+            Round the canonical weights to this many decimals (approximate).
+        scale_invariant : bool, optional
+            Divide the canonical weights by their sum. Only valid for learners whose fit
+            does not depend on the overall scale of the sample weights (approximate).
+        """
+        self.maxsize = maxsize
+        self.present_cells = None if present_cells is None else np.asarray(present_cells, dtype=bool)
+        self.decimals = decimals
+        self.scale_invariant = scale_invariant
+        self.cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, program):
+        canonical = np.asarray(program, dtype=np.float64)
+        if self.present_cells is not None:
+            canonical = canonical[self.present_cells]
+        if self.scale_invariant and canonical.sum() > 0:
+            canonical = canonical / canonical.sum()
+        if self.decimals is not None:
+            canonical = np.round(canonical, self.decimals)
+        # adding 0.0 turns -0.0 into 0.0, so both give the same bytes
+        return (canonical + 0.0).tobytes()
+
+    def evaluate(self, programs, batch_fitness_func, cacheable=None):
+        """
+        Returns the (pop, n_obj) fitness of a (pop, ind_size) genome matrix, calling
+        batch_fitness_func once on the distinct genomes that are not cached yet.
+        If given, only new fitness rows for which cacheable(row) is true are cached.
+        """
+        keys = [self.key(program) for program in programs]
+        misses = {}
+        for i, key in enumerate(keys):
+            if key in self.cache:
+                self.cache.move_to_end(key)
+            elif key not in misses:
+                misses[key] = i
+
+        self.misses += len(misses)
+        self.hits += len(keys) - len(misses)
+
+        new_fitness = {}
+        if len(misses) > 0:
+            miss_fitness = batch_fitness_func(programs[list(misses.values())])
+            new_fitness = dict(zip(misses.keys(), miss_fitness))
+
+        fitness = np.array([new_fitness[key] if key in new_fitness else self.cache[key] for key in keys], dtype=float)
+
+        for key, value in new_fitness.items():
+            if cacheable is None or cacheable(value):
+                self._insert(key, value)
+        return fitness
+
+    def lookup(self, program):
+        """Returns the cached fitness of a single genome, or None; counts a hit or a miss."""
+        key = self.key(program)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return self.cache[key]
+        self.misses += 1
+        return None
+
+    def store(self, program, fitness):
+        """Caches the fitness of a single genome evaluated outside of evaluate."""
+        self._insert(self.key(program), np.asarray(fitness, dtype=float))
+
+    def _insert(self, key, value):
+        self.cache[key] = value
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.cache),
+                'hit_rate': self.hits / total if total > 0 else 0.0}
+
+
+class SurrogateScreen:
+
+    def __init__(self, model=None, oversample=4, min_train=None, random_state=0):
+        """
+        Surrogate-assisted pre-screening of NSGA-II offspring.
+
+        A regressor is trained on the archive (genome -> objectives) every generation.
+        oversample times more offspring than usual are bred, and only those predicted to be
+        on the first front of the population plus the candidates are evaluated for real
+        (at most pop_size, at least one).
+
+        Parameters
+        ----------
+        model : sklearn regressor, optional
+            Multi-output regressor; defaults to a RandomForestRegressor.
+        oversample : int, optional
+            Number of candidates bred per usual offspring.
+        min_train : int, optional
+            Archive size needed before screening starts; defaults to 2 * pop_size.
+        random_state : int, optional
+            Seed of the default model.
+        """
+        self.model = model if model is not None else RandomForestRegressor(n_estimators=100, random_state=random_state)
+        self.oversample = oversample
+        self.min_train = min_train
+        self.history = []
+
+    def ready(self, archive_size, pop_size):
+        min_train = 2 * pop_size if self.min_train is None else self.min_train
+        return archive_size >= min_train
+
+    def fit(self, archive):
+        n = len(archive)
+        self.model.fit(archive.genomes[:n], archive.objectives[:n])
+
+    def screen(self, candidate_programs, population_scores, n_max):
+        """
+        Returns the indices of the candidates to evaluate for real and their predicted scores.
+        """
+        predicted = np.asarray(self.model.predict(candidate_programs), dtype=float).reshape(len(candidate_programs), -1)
+        n_pop = len(population_scores)
+        all_scores = np.concatenate((population_scores, predicted), axis=0)
+        n_obj = all_scores.shape[1]
+
+        fronts, ranks = nsga.non_dominated_sorting(obj_scores=all_scores, weights=np.ones(n_obj, dtype=float))
+        crowding_distance = nsga.crowding_distance(all_scores, n_obj, fronts)
+
+        # candidates ordered by predicted rank, then by decreasing crowding distance
+        order = np.lexsort((-crowding_distance[n_pop:], ranks[n_pop:]))
+        n_front = int(np.sum(ranks[n_pop:] == 0))
+        selected = order[:min(max(n_front, 1), n_max)]
+        return selected, predicted[selected]
+
+    def record(self, generation, n_candidates, n_max, predicted, actual):
+        """Logs the surrogate's error on the evaluated candidates and the evaluations saved."""
+        entry = {'generation': generation, 'n_candidates': n_candidates, 'n_real': len(actual),
+                 'n_saved': n_max - len(actual), 'mae': np.mean(np.abs(predicted - actual), axis=0).tolist()}
+        self.history.append(entry)
+        return entry
+
+    def summary(self):
+        return {'generations': len(self.history),
+                'n_real': sum(h['n_real'] for h in self.history),
+                'n_saved': sum(h['n_saved'] for h in self.history)}
+
+
+class BatchFitness:
+
+    def __init__(self, fitness_func, executor=None):
+        """
+        Batched fitness contract around a per-individual fitness function.
+
+        Parameters
+        ----------
+        fitness_func : function
+            Maps one individual's program to a tuple of objective values.
+        executor : concurrent.futures.Executor, optional
+            Anything with an order-preserving `map`, e.g. a ProcessPoolExecutor or
+            joblib's loky `get_reusable_executor()`. Individuals are evaluated serially if None.
+        """
+        self.fitness_func = fitness_func
+        self.executor = executor
+
+    def __call__(self, programs):
+        """Maps a (pop, ind_size) weight matrix to a (pop, n_obj) array of fitness values."""
+        programs = np.asarray(programs, dtype=float)
+        if self.executor is None:
+            results = [self.fitness_func(program) for program in programs]
+        else:
+            results = list(self.executor.map(self.fitness_func, programs))
+        return np.array(results, dtype=float).reshape(len(programs), -1)
+
 
 class GA():
-    def __init__(self, ind_size, pop_size, max_gens, random_state, mut_rate, cross_rate, fitness_func, use_nsga=False):
+    def __init__(self, ind_size, pop_size, max_gens, random_state, mut_rate, cross_rate, fitness_func, use_nsga=False, executor=None, batch_fitness_func=None, fitness_cache=None, variation='vectorized', checkpoint_dir=None, checkpoint_every=1, steady_state=False, max_in_flight=None, surrogate=None, hv_tol=None, hv_patience=5, hv_ref=None):
         """
         Unified GA class with optional NSGA-II term.
         
@@ -29,9 +461,52 @@ class GA():
         cross_rate : float
             Crossover rate.
         fitness_func : function
-            Function to evaluate fitness of individuals.
+            Function to evaluate fitness of individuals. If it has a true `reports_fidelity`
+            attribute (see utils.RacingEvaluator), its last return value is the fidelity of
+            the estimate rather than an objective, and with use_nsga its `update_front` is
+            given the full-fidelity first front before every generation's offspring are
+            evaluated.
         use_nsga : bool, optional
             Use NSGA-II if True, standard GA otherwise. Default is False.
+        executor : concurrent.futures.Executor, optional
+            Spreads the individuals of a population across workers, see BatchFitness.
+        batch_fitness_func : function, optional
+            Maps a (pop, ind_size) weight matrix to a (pop, n_obj) fitness array. Defaults to
+            BatchFitness(fitness_func, executor).
+        fitness_cache : FitnessCache, optional
+            Reuses the fitness of genomes that were already evaluated. No caching if None.
+        variation : str, optional
+            'vectorized' draws all parents of a generation in one batch and produces all
+            offspring at once with array-level crossover and mutation masks. 'sequential'
+            selects parents one call at a time and calls crossover and mutation per child,
+            drawing random numbers gene by gene, which reproduces runs of earlier versions.
+        checkpoint_dir : str, optional
+            Folder for snapshots of the run. If given, optimize resumes from the latest
+            snapshot found there and continues bit-exactly. No snapshots if None.
+        checkpoint_every : int, optional
+            Snapshot every this many generations (and always after the last one).
+        steady_state : bool, optional
+            With use_nsga, run an asynchronous steady-state NSGA-II instead of the generational
+            loop: the same (max_gens - 1) * pop_size offspring evaluations are kept in flight on
+            executor, and each result is inserted into the population as soon as it completes.
+            Evaluates every child with fitness_func, so it cannot be combined with
+            batch_fitness_func, nor with checkpoint_dir, surrogate or hv_tol. With an executor,
+            results depend on completion order.
+        max_in_flight : int, optional
+            Number of concurrent evaluations in steady-state mode. Defaults to pop_size.
+        surrogate : SurrogateScreen, optional
+            With use_nsga, pre-screens over-generated offspring with a surrogate model so
+            that only promising ones are evaluated for real. No screening if None.
+        hv_tol : float, optional
+            Stop early once the hypervolume of the population's first front has improved by
+            less than this relative amount over the last hv_patience generations. The
+            hypervolume is tracked every generation but never stops the run if None.
+        hv_patience : int, optional
+            Number of generations of the stagnation window.
+        hv_ref : array-like, optional
+            Reference point of the (maximized) hypervolume. Defaults to the worst value of each
+            objective in the initial population, which differs between runs; pass a fixed one
+            to compare hypervolumes across runs.
         """
         self.max_gens = max_gens
         self.pop_size = pop_size
@@ -39,11 +514,60 @@ class GA():
         self.mut_rate = mut_rate
         self.cross_rate = cross_rate
         self.fitness_func = fitness_func
+        self.racing = getattr(fitness_func, 'reports_fidelity', False)
+        self.batch_fitness_func = batch_fitness_func if batch_fitness_func is not None else BatchFitness(fitness_func, executor)
         self.rng = np.random.default_rng(random_state)
         self.population = []
         self.best_individual = None
-        self.evaluated_individuals = pd.DataFrame(columns = ['individual','perf_fitness','fair_fitness'])
+        self.fitness_cache = fitness_cache
+        self.archive = Archive(ind_size)
+        self.generation = 1
         self.use_nsga = use_nsga
+        if variation not in ('vectorized', 'sequential'):
+            raise ValueError(f"variation={variation} must be 'vectorized' or 'sequential'")
+        self.variation = variation
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_every = checkpoint_every
+        if steady_state and not use_nsga:
+            raise ValueError("steady_state requires use_nsga=True")
+        self.steady_state = steady_state
+        if steady_state and self.racing:
+            raise ValueError("fitness functions that report fidelity require the generational loop")
+        if steady_state:
+            # children are evaluated one at a time with fitness_func, never in batches
+            for name, value in (('batch_fitness_func', batch_fitness_func), ('checkpoint_dir', checkpoint_dir), ('surrogate', surrogate), ('hv_tol', hv_tol)):
+                if value is not None:
+                    raise ValueError(f"{name} is not supported with steady_state=True")
+        self.max_in_flight = pop_size if max_in_flight is None else max_in_flight
+        self.executor = executor
+        if surrogate is not None and not use_nsga:
+            raise ValueError("surrogate requires use_nsga=True")
+        self.surrogate = surrogate
+        self.hv_tol = hv_tol
+        self.hv_patience = hv_patience
+        self.hv_ref = None if hv_ref is None else np.asarray(hv_ref, dtype=float)
+        self.hv_history = []
+        self.stopped_generation = None
+        self.saved_evaluations = 0
+        # non-dominated set of every full-fidelity evaluation so far, with its hypervolume
+        self.pareto = ParetoArchive(self.hv_ref)
+
+    @property
+    def evaluated_individuals(self):
+        """DataFrame view of self.archive with columns 'individual', 'perf_fitness', 'fair_fitness', 'generation', 'timestamp' and 'fidelity'."""
+        return self.archive.to_frame()
+
+
+    def feed_pareto(self, start=0):
+        """Inserts the full-fidelity archive rows from start on into self.pareto."""
+        rows = np.arange(start, len(self.archive))
+        rows = rows[self.archive.fidelity[rows] == 1.0]
+        self.pareto.extend(self.archive.objectives[rows], rows.tolist())
+
+
+    def pareto_rows(self):
+        """Rows of evaluated_individuals on the front of everything evaluated, in row order."""
+        return sorted(self.pareto.rows)
 
 
     def initialize_population(self):
@@ -86,25 +610,57 @@ class GA():
         return Individual(child, None)
 
 
+    def vary(self, programs_a, programs_b):
+        """
+        Vectorized uniform crossover and mutation of whole (n, ind_size) parent matrices.
+
+        Same operators as crossover followed by mutation: with probability cross_rate a child
+        takes each gene from either parent with equal probability (otherwise it copies parent
+        a), then each gene is moved up or down by a uniform step with probability mut_rate and
+        clipped to [0, 2].
+        """
+        n, m = programs_a.shape
+        do_cross = self.rng.random(n) < self.cross_rate
+        take_b = do_cross[:, None] & (self.rng.random((n, m)) >= 0.5)
+        children = np.where(take_b, programs_b, programs_a)
+
+        mutate = self.rng.random((n, m)) < self.mut_rate
+        up = self.rng.random((n, m)) < 0.5
+        step = self.rng.random((n, m))
+        mutated = np.clip(np.where(up, children + step, children - step), 0, 2)
+        return np.where(mutate, mutated, children)
+
+
+    def make_offspring(self, parents_a, parents_b):
+        """Returns one child Individual per pair of parents, see 'variation'."""
+        if self.variation == 'sequential':
+            return [self.mutation(self.crossover(a, b)) for a, b in zip(parents_a, parents_b)]
+
+        programs = self.vary(np.vstack([a.program for a in parents_a]), np.vstack([b.program for b in parents_b]))
+        return [Individual(program, None) for program in programs]
+
+
+    def fitness_matrix(self, pop=None):
+        """(pop, n_obj) array of the fitness of pop, by default the population."""
+        pop = self.population if pop is None else pop
+        return np.array([ind.fitness for ind in pop], dtype=float)
+
+
     def selection(self):
         # Maximize all objectives
         # Adapted from https://deap.readthedocs.io/en/master/_modules/deap/tools/selection.html#selAutomaticEpsilonLexicase
         # Accounts for GA vs NSGA-II
-
-        candidates = self.population
+        # Draws one parent; select_parents draws a whole generation's parents at once
         cases = list(range(len(self.population[0].fitness)))
         self.rng.shuffle(cases)
+        pool = epsilon_lexicase_pool(self.fitness_matrix(), cases)
+        return self.population[self.rng.choice(pool)]
 
-        while len(cases) > 0 and len(candidates) > 1:
-            errors_for_this_case = [x.fitness[cases[0]] for x in candidates]
-            median_val = np.median(errors_for_this_case)
-            median_absolute_deviation = np.median([abs(x - median_val) for x in errors_for_this_case])
-            best_val_for_case = max(errors_for_this_case)
-            min_val_to_survive = best_val_for_case - median_absolute_deviation
-            candidates = [x for x in candidates if x.fitness[cases[0]] >= min_val_to_survive]
-            cases.pop(0)
 
-        return self.rng.choice(candidates)
+    def select_parents(self, n_parents):
+        """Draws n_parents Individuals by epsilon lexicase selection in one batch."""
+        parent_ids = epsilon_lexicase_select(self.fitness_matrix(), n_parents, self.rng)
+        return [self.population[i] for i in parent_ids]
 
 
     def evaluate_population(self, pop):
@@ -116,10 +672,34 @@ class GA():
         pop : list[Individual], optional
             A specific population to evaluate. Defaults to `self.population`.
         """
-        for individual in pop:
-            individual.fitness = self.fitness_func(individual.program)
-            # Update self.evaluated_individuals
-            self.evaluated_individuals.loc[len(self.evaluated_individuals.index)] = {'individual':individual.program,'perf_fitness':individual.fitness[0],'fair_fitness':individual.fitness[1]}
+        if len(pop) == 0:
+            return pop
+
+        # evaluate the whole population in one batch
+        programs = np.vstack([individual.program for individual in pop])
+        instrumentation.count('ga.individuals', len(pop))
+        with instrumentation.timer('ga.evaluate'):
+            if self.fitness_cache is None:
+                fitness = self.batch_fitness_func(programs)
+            else:
+                # raced estimates were stopped against the front of their generation, so only
+                # full-fidelity rows are reused; partial ones are raced again next time
+                cacheable = (lambda row: row[-1] == 1.0) if self.racing else None
+                fitness = self.fitness_cache.evaluate(programs, self.batch_fitness_func, cacheable)
+        assert fitness.shape[0] == len(pop), "Batched fitness function must return one row per individual."
+        if self.racing:
+            # the last column is the fraction of folds behind each estimate
+            fitness, fidelity = fitness[:, :-1], fitness[:, -1]
+        else:
+            fidelity = np.ones(len(pop))
+
+        for individual, ind_fitness, ind_fidelity in zip(pop, fitness, fidelity):
+            individual.fitness = tuple(ind_fitness)
+            individual.fidelity = float(ind_fidelity)
+        # Update self.evaluated_individuals
+        start = len(self.archive)
+        self.archive.append([individual.program for individual in pop], fitness, self.generation, fidelity=fidelity)
+        self.feed_pareto(start)
         
         return pop
     
@@ -128,20 +708,20 @@ class GA():
         """
         Updates the best individual from the current population using lexicase-style selection.
         """
-        candidates = self.population
-        cases = list(range(len(self.population[0].fitness)))
-    
-        while len(cases) > 0 and len(candidates) > 1:
-            best_val_for_case = max([x.fitness[cases[0]] for x in candidates])
-            candidates = [x for x in candidates if x.fitness[cases[0]] == best_val_for_case]
-            cases.pop(0)
-        self.best_individual = self.rng.choice(candidates)
+        fitness = self.fitness_matrix()
+        pool = np.arange(len(fitness))
+        for case in range(fitness.shape[1]):
+            if len(pool) <= 1:
+                break
+            pool = pool[fitness[pool, case] == fitness[pool, case].max()]
+        self.best_individual = self.population[self.rng.choice(pool)]
 
 
     def step_optimize(self):
         """
         Progresses the optimization prcedure by a single iteration.
         """
+        self.generation += 1
         if self.use_nsga:
             # NSGA-II Optimization Step
             ### Parent Selection
@@ -149,45 +729,71 @@ class GA():
             parent_ids = []
             scores = np.array([[ind.fitness[0], ind.fitness[1]] for ind in pop], dtype=float)
             parent_cnt = 2*self.pop_size # Number of parents to select; 2*pop_size because of crossover
+            screening = self.surrogate is not None and self.surrogate.ready(len(self.archive), self.pop_size)
+            if screening:
+                # over-generate candidates for the surrogate to filter
+                parent_cnt *= self.surrogate.oversample
 
             # get the fronts and rank
-            fronts, ranks = nsga.non_dominated_sorting(obj_scores=scores, weights=np.array([1, 1], dtype=float))
+            with instrumentation.timer('nsga.sort'):
+                fronts, ranks = nsga.non_dominated_sorting(obj_scores=scores, weights=np.array([1, 1], dtype=float))
             # make sure that the number of fronts is correct
             assert sum([len(f) for f in fronts]) == len(ranks)
 
             # get crowding distance for each solution (per-front)
-            crowding_distance = nsga.crowding_distance(scores, 2, fronts)
+            with instrumentation.timer('nsga.crowding'):
+                crowding_distance = nsga.crowding_distance(scores, 2, fronts)
+
+            if self.racing:
+                # race the offspring against the first front of fully evaluated members; a
+                # stopped child is dominated by that front, so it never enters the first front
+                full = np.array([ind.fidelity == 1.0 for ind in pop])
+                if full.any():
+                    full_fronts, _ = nsga.non_dominated_sorting(obj_scores=scores[full], weights=np.array([1, 1], dtype=float))
+                    self.fitness_func.update_front(scores[full][full_fronts[0]])
+                else:
+                    self.fitness_func.update_front(None)
 
             # get parent_cnt number of parents
-            for _ in range(parent_cnt):
-                parent_ids.append(nsga.non_dominated_binary_tournament(rng=self.rng, ranks=ranks, distances=crowding_distance))
+            with instrumentation.timer('ga.selection'):
+                if self.variation == 'sequential':
+                    for _ in range(parent_cnt):
+                        parent_ids.append(nsga.non_dominated_binary_tournament(rng=self.rng, ranks=ranks, distances=crowding_distance))
+                else:
+                    parent_ids = nsga.non_dominated_binary_tournaments(ranks=ranks, distances=crowding_distance, rng=self.rng, parent_cnt=parent_cnt)
 
             # Offspring Generation
-            offspring = []
-            j = 0
-            for i in range(self.pop_size):
-                parent_a = pop[parent_ids[j]]
-                parent_b = pop[parent_ids[j+1]]
-                child = self.crossover(parent_a, parent_b)
-                child = self.mutation(child)
-                offspring.append(child)
-                j += 2
-
-            # Evaluate the offspring
-            offspring = self.evaluate_population(offspring)
+            with instrumentation.timer('ga.variation'):
+                offspring = self.make_offspring([pop[i] for i in parent_ids[0::2]], [pop[i] for i in parent_ids[1::2]])
+
+            if screening:
+                # Evaluate only the candidates predicted to be non-dominated
+                self.surrogate.fit(self.archive)
+                selected, predicted = self.surrogate.screen(np.vstack([ind.program for ind in offspring]), scores, self.pop_size)
+                n_candidates = len(offspring)
+                offspring = self.evaluate_population([offspring[i] for i in selected])
+                actual = np.array([ind.fitness for ind in offspring], dtype=float)
+                entry = self.surrogate.record(self.generation, n_candidates, self.pop_size, predicted, actual)
+                instrumentation.event('surrogate.generation', **entry)
+            else:
+                # Evaluate the offspring
+                offspring = self.evaluate_population(offspring)
 
             # combine both the population and offspring scores
             offspring_scores = np.array([[ind.fitness[0], ind.fitness[1]] for ind in offspring], dtype=float)
             all_scores = np.array(np.concatenate((scores, offspring_scores), axis=0), dtype=float)
 
             # get the fronts and rank
-            fronts, _ = nsga.non_dominated_sorting(obj_scores=all_scores, weights=np.array([1,1], dtype=float))
+            with instrumentation.timer('nsga.sort'):
+                fronts, _ = nsga.non_dominated_sorting(obj_scores=all_scores, weights=np.array([1,1], dtype=float))
 
             # get crowding distance for each solution (per-front)
-            crowding_distance = nsga.crowding_distance(all_scores, 2, fronts)
+            with instrumentation.timer('nsga.crowding'):
+                crowding_distance = nsga.crowding_distance(all_scores, 2, fronts)
 
             # truncate the population to the population size with nsga ii
-            survivor_ids = nsga.non_dominated_truncate(fronts, crowding_distance, self.pop_size)
+            with instrumentation.timer('nsga.truncate'):
+                survivor_ids = nsga.non_dominated_truncate(fronts, crowding_distance, self.pop_size)
             # make sure that the number of survivors is correct
             assert len(survivor_ids) == self.pop_size
 
@@ -206,39 +812,431 @@ class GA():
         
         else:
             # Standard GA Optimization Step
-            _population = []
-            for i in range(self.pop_size):
-                parent_a = self.selection()
-                parent_b = self.selection()
+            if self.variation == 'sequential':
+                _population = []
+                for i in range(self.pop_size):
+                    parent_a = self.selection()
+                    parent_b = self.selection()
 
-                child = self.crossover(parent_a, parent_b)
+                    child = self.crossover(parent_a, parent_b)
 
-                child = self.mutation(child)
+                    child = self.mutation(child)
 
-                _population.append(child)
+                    _population.append(child)
+            else:
+                with instrumentation.timer('ga.selection'):
+                    parents = self.select_parents(2*self.pop_size)
+                with instrumentation.timer('ga.variation'):
+                    _population = self.make_offspring(parents[0::2], parents[1::2])
 
             self.population = self.evaluate_population(_population)
     
 
-    def optimize(self):
+    def steady_state_offspring(self):
+        """Breeds one child from two binary-tournament parents of the current population."""
+        scores = np.array([ind.fitness for ind in self.population], dtype=float)
+        n_obj = scores.shape[1]
+        fronts, ranks = nsga.non_dominated_sorting(obj_scores=scores, weights=np.ones(n_obj, dtype=float))
+        crowding_distance = nsga.crowding_distance(scores, n_obj, fronts)
 
+        if self.variation == 'sequential':
+            parent_a = self.population[nsga.non_dominated_binary_tournament(rng=self.rng, ranks=ranks, distances=crowding_distance)]
+            parent_b = self.population[nsga.non_dominated_binary_tournament(rng=self.rng, ranks=ranks, distances=crowding_distance)]
+        else:
+            ids = nsga.non_dominated_binary_tournaments(ranks=ranks, distances=crowding_distance, rng=self.rng, parent_cnt=2)
+            parent_a, parent_b = self.population[ids[0]], self.population[ids[1]]
+        return self.make_offspring([parent_a], [parent_b])[0]
+
+
+    def steady_state_insert(self, child):
+        """Adds an evaluated child to the population and drops the worst by NSGA-II truncation."""
+        self.archive.append(child.program, [child.fitness], 1 + len(self.archive) // self.pop_size)
+        self.feed_pareto(len(self.archive) - 1)
+
+        candidates = self.population + [child]
+        scores = np.array([ind.fitness for ind in candidates], dtype=float)
+        n_obj = scores.shape[1]
+        fronts, _ = nsga.non_dominated_sorting(obj_scores=scores, weights=np.ones(n_obj, dtype=float))
+        crowding_distance = nsga.crowding_distance(scores, n_obj, fronts)
+        survivor_ids = nsga.non_dominated_truncate(fronts, crowding_distance, self.pop_size)
+        self.population = [candidates[i] for i in survivor_ids]
+
+
+    def optimize_steady_state(self):
         """
-        Responsible for managing the optimization process.
-        Differentiates behavior for GA and NSGA-II based on 'use_nsga'.
-        """
+        Asynchronous steady-state NSGA-II with the evaluation budget of the generational loop.
 
+        Keeps max_in_flight offspring evaluations running on the executor; whenever one
+        completes, its child is inserted into the population and a replacement offspring is
+        bred and submitted right away, so no worker waits for a whole generation.
+        """
         print("Generation 1 started:")
         self.initialize_population()
+        budget = (self.max_gens - 1) * self.pop_size
+
+        def evaluate(child):
+            cached = None if self.fitness_cache is None else self.fitness_cache.lookup(child.program)
+            if cached is not None:
+                return tuple(cached)
+            fitness = tuple(np.asarray(self.fitness_func(child.program), dtype=float))
+            if self.fitness_cache is not None:
+                self.fitness_cache.store(child.program, fitness)
+            return fitness
+
+        if self.executor is None:
+            for _ in range(budget):
+                child = self.steady_state_offspring()
+                child.fitness = evaluate(child)
+                self.steady_state_insert(child)
+        else:
+            in_flight = {}
+            submitted = 0
+            while submitted < budget or len(in_flight) > 0:
+                while submitted < budget and len(in_flight) < self.max_in_flight:
+                    child = self.steady_state_offspring()
+                    cached = None if self.fitness_cache is None else self.fitness_cache.lookup(child.program)
+                    if cached is not None:
+                        child.fitness = tuple(cached)
+                        self.steady_state_insert(child)
+                    else:
+                        in_flight[self.executor.submit(self.fitness_func, child.program)] = child
+                    submitted += 1
+                if len(in_flight) == 0:
+                    continue
+
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    child = in_flight.pop(future)
+                    child.fitness = tuple(np.asarray(future.result(), dtype=float))
+                    if self.fitness_cache is not None:
+                        self.fitness_cache.store(child.program, child.fitness)
+                    self.steady_state_insert(child)
+
+        self.generation = self.max_gens
         self.update_best_individual()
-        print("Generation 1 ended.")
+        print(f"Steady-state run ended after {len(self.archive)} evaluations.")
         print("Best Individual so far:", self.best_individual.fitness)
 
+
+    def track_hypervolume(self):
+        """
+        Appends the hypervolume of the population's first front to hv_history and returns
+        True if it has stagnated, i.e. improved by less than hv_tol (relative) over the last
+        hv_patience generations.
+        """
+        scores = np.array([ind.fitness for ind in self.population], dtype=float)
+        if self.hv_ref is None:
+            self.hv_ref = np.nanmin(scores, axis=0)
+            self.pareto.set_ref(self.hv_ref)
+        fronts, _ = nsga.non_dominated_sorting(obj_scores=scores, weights=np.ones(scores.shape[1], dtype=float))
+        self.hv_history.append(nsga.hypervolume(scores[fronts[0]], self.hv_ref))
+
+        if self.hv_tol is None or len(self.hv_history) <= self.hv_patience:
+            return False
+        previous = self.hv_history[-1 - self.hv_patience]
+        if previous == 0:
+            # nothing beat the reference point yet, so there is no relative improvement to measure
+            return False
+        improvement = self.hv_history[-1] - previous
+        return improvement <= self.hv_tol * abs(previous)
+
+
+    def emigrants(self, n_migrants):
+        """
+        Returns up to n_migrants (program, fitness, fidelity) tuples of the population's first
+        front, the most isolated ones (largest crowding distance) first.
+        """
+        scores = np.array([ind.fitness for ind in self.population], dtype=float)
+        n_obj = scores.shape[1]
+        fronts, _ = nsga.non_dominated_sorting(obj_scores=scores, weights=np.ones(n_obj, dtype=float))
+        crowding_distance = nsga.crowding_distance(scores, n_obj, fronts)
+        first_front = sorted(fronts[0], key=lambda i: -crowding_distance[i])[:n_migrants]
+        return [(self.population[i].program, self.population[i].fitness, self.population[i].fidelity) for i in first_front]
+
+
+    def immigrate(self, migrants):
+        """
+        Adds already evaluated (program, fitness, fidelity) tuples from another island and
+        truncates the population back to pop_size with NSGA-II. Migrants are not added to
+        the archive, since the island that evaluated them already recorded them.
+        """
+        candidates = self.population + [Individual(*migrant) for migrant in migrants]
+        scores = np.array([ind.fitness for ind in candidates], dtype=float)
+        n_obj = scores.shape[1]
+        fronts, _ = nsga.non_dominated_sorting(obj_scores=scores, weights=np.ones(n_obj, dtype=float))
+        crowding_distance = nsga.crowding_distance(scores, n_obj, fronts)
+        survivor_ids = nsga.non_dominated_truncate(fronts, crowding_distance, self.pop_size)
+        self.population = [candidates[i] for i in survivor_ids]
+
+
+    def checkpoint_path(self):
+        return os.path.join(self.checkpoint_dir, 'checkpoint.pkl')
+
+
+    def save_checkpoint(self):
+        """
+        Atomically snapshots the population, best individual, archive, fitness cache,
+        RNG bit-generator state and generation counter to checkpoint_dir.
+        """
+        n = len(self.archive)
+        state = {
+            'generation': self.generation,
+            'rng_state': self.rng.bit_generator.state,
+            'population': [(ind.program, ind.fitness, ind.fidelity) for ind in self.population],
+            'best_individual': (self.best_individual.program, self.best_individual.fitness),
+            'archive': {'objective_names': self.archive.objective_names, 'genomes': self.archive.genomes[:n],
+                        'objectives': self.archive.objectives[:n], 'generation': self.archive.generation[:n],
+                        'timestamp': self.archive.timestamp[:n], 'fidelity': self.archive.fidelity[:n]},
+            'hv_history': self.hv_history,
+            'hv_ref': self.hv_ref,
+            'stopped_generation': self.stopped_generation,
+            'saved_evaluations': self.saved_evaluations,
+            'fitness_cache': None if self.fitness_cache is None else
+                             {'cache': self.fitness_cache.cache, 'hits': self.fitness_cache.hits, 'misses': self.fitness_cache.misses},
+        }
+
+        # write to a temporary file and rename it, so a preempted write never corrupts the snapshot
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.checkpoint_dir, prefix='.tmp_')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(state, f)
+        os.replace(tmp_path, self.checkpoint_path())
+
+
+    def load_checkpoint(self):
+        """Restores the state written by save_checkpoint. Returns False if there is no snapshot."""
+        if self.checkpoint_dir is None or not os.path.exists(self.checkpoint_path()):
+            return False
+        with open(self.checkpoint_path(), 'rb') as f:
+            state = pickle.load(f)
+
+        self.generation = state['generation']
+        self.rng.bit_generator.state = state['rng_state']
+        self.population = [Individual(*ind) for ind in state['population']]
+        self.best_individual = Individual(*state['best_individual'])
+        self.hv_history = state.get('hv_history', [])
+        self.hv_ref = state.get('hv_ref', self.hv_ref)
+        self.stopped_generation = state.get('stopped_generation')
+        self.saved_evaluations = state.get('saved_evaluations', 0)
+
+        archive = state['archive']
+        self.archive = Archive(self.ind_size, archive['objective_names'], capacity=max(1024, len(archive['genomes'])))
+        self.archive.append(archive['genomes'], archive['objectives'], archive['generation'], archive['timestamp'],
+                            archive.get('fidelity', 1.0))
+        self.pareto = ParetoArchive(self.hv_ref)
+        self.feed_pareto()
+
+        if self.fitness_cache is not None and state['fitness_cache'] is not None:
+            self.fitness_cache.cache = state['fitness_cache']['cache']
+            self.fitness_cache.hits = state['fitness_cache']['hits']
+            self.fitness_cache.misses = state['fitness_cache']['misses']
+        return True
+
+
+    def optimize(self):
+
+        """
+        Responsible for managing the optimization process.
+        Differentiates behavior for GA and NSGA-II based on 'use_nsga'.
+        With a checkpoint_dir, resumes from the latest snapshot and saves new ones as it goes.
+        """
+        if self.steady_state:
+            self.optimize_steady_state()
+            if self.fitness_cache is not None:
+                print("Fitness cache:", self.fitness_cache.stats())
+            return
+
+        if self.load_checkpoint():
+            print(f"Resuming from generation {self.generation} checkpoint.")
+        else:
+            print("Generation 1 started:")
+            with instrumentation.timer('ga.generation'):
+                self.initialize_population()
+                self.update_best_individual()
+            print("Generation 1 ended.")
+            print("Best Individual so far:", self.best_individual.fitness)
+            self.track_hypervolume()
+            instrumentation.event('generation', generation=self.generation, best=self.best_individual.fitness, hypervolume=self.hv_history[-1])
+            if self.checkpoint_dir is not None:
+                with instrumentation.timer('ga.checkpoint'):
+                    self.save_checkpoint()
+
         # Rest of the generations
-        for gen in range(self.max_gens - 1):
-            print(f"Generation {gen + 2} started:")
-            self.step_optimize()
-            self.update_best_individual()
-            print(f"Generation {gen + 2} ended.")
+        while self.generation < self.max_gens and self.stopped_generation is None:
+            print(f"Generation {self.generation + 1} started:")
+            with instrumentation.timer('ga.generation'):
+                self.step_optimize()
+                self.update_best_individual()
+            print(f"Generation {self.generation} ended.")
             print("Best Individual so far:", self.best_individual.fitness)
- 
+            if self.track_hypervolume() and self.generation < self.max_gens:
+                self.stopped_generation = self.generation
+                self.saved_evaluations = (self.max_gens - self.generation) * self.pop_size
+                print(f"Hypervolume stagnated; stopping at generation {self.generation}, saving {self.saved_evaluations} evaluations.")
+            instrumentation.event('generation', generation=self.generation, best=self.best_individual.fitness, hypervolume=self.hv_history[-1])
+            if self.checkpoint_dir is not None and (self.generation % self.checkpoint_every == 0 or self.generation == self.max_gens or self.stopped_generation is not None):
+                with instrumentation.timer('ga.checkpoint'):
+                    self.save_checkpoint()
 
+        if self.fitness_cache is not None:
+            print("Fitness cache:", self.fitness_cache.stats())
+            instrumentation.event('fitness_cache', **self.fitness_cache.stats())
+        if self.surrogate is not None:
+            print("Surrogate:", self.surrogate.summary())
+            instrumentation.event('surrogate', **self.surrogate.summary())
+
+
+def _run_island(island, n_islands, ga_kwargs, seed, migration_interval, n_migrants, n_jobs, inboxes, results):
+    """Body of one island process of IslandModel; reports its archive or its traceback on results."""
+    try:
+        executor = concurrent.futures.ThreadPoolExecutor(n_jobs) if n_jobs > 1 else None
+        ga = GA(random_state=seed, executor=executor, **ga_kwargs)
+        ga.initialize_population()
+        ga.update_best_individual()
+        ga.track_hypervolume()
+        # per-generation records, written as instrumentation events by the parent process
+        generations = [{'generation': ga.generation, 'best': ga.best_individual.fitness, 'hypervolume': ga.hv_history[-1]}]
+        while ga.generation < ga.max_gens:
+            ga.step_optimize()
+            if n_islands > 1 and ga.generation % migration_interval == 0 and ga.generation < ga.max_gens:
+                # ring topology: send to the next island, then wait for the previous one
+                inboxes[(island + 1) % n_islands].put(ga.emigrants(n_migrants))
+                ga.immigrate(inboxes[island].get())
+            ga.update_best_individual()
+            ga.track_hypervolume()
+            generations.append({'generation': ga.generation, 'best': ga.best_individual.fitness, 'hypervolume': ga.hv_history[-1]})
+        if executor is not None:
+            executor.shutdown()
+
+        n = len(ga.archive)
+        results.put((island, {
+            'objective_names': ga.archive.objective_names, 'genomes': ga.archive.genomes[:n],
+            'objectives': ga.archive.objectives[:n], 'generation': ga.archive.generation[:n],
+            'timestamp': ga.archive.timestamp[:n], 'fidelity': ga.archive.fidelity[:n],
+            'population': [(ind.program, ind.fitness, ind.fidelity) for ind in ga.population],
+            'hv_history': ga.hv_history,
+            'generations': generations,
+        }))
+    except BaseException:
+        results.put((island, traceback.format_exc()))
+
+
+class IslandModel:
+
+    def __init__(self, n_islands, migration_interval, random_state, n_migrants=2, n_jobs_per_island=1, mp_context=None, **ga_kwargs):
+        """
+        Island-model driver running one GA per process and merging their archives.
+
+        Every island evolves its own population from its own seed. After every
+        migration_interval generations, each island sends the n_migrants most isolated
+        individuals of its first front to the next island of a ring over a local queue and
+        merges the ones it receives by NSGA-II truncation. Migration is synchronous, so a run
+        is reproducible for a given random_state.
+
+        Parameters
+        ----------
+        n_islands : int
+            Number of island processes.
+        migration_interval : int
+            Generations between migrations (M).
+        random_state : int
+            Seed from which the island seeds are spawned.
+        n_migrants : int, optional
+            Individuals sent per migration.
+        n_jobs_per_island : int, optional
+            Threads evaluating each island's population; serial if 1.
+        mp_context : multiprocessing context, optional
+            Defaults to the platform's default start method. fitness_func and the other
+            GA arguments must be picklable if it is 'spawn'.
+        **ga_kwargs
+            Arguments of GA (ind_size, pop_size, max_gens, mut_rate, cross_rate,
+            fitness_func, use_nsga, ...). Checkpointing, steady-state mode and hypervolume
+            stopping are not supported on islands.
+        """
+        for name in ('checkpoint_dir', 'executor', 'hv_tol'):
+            if ga_kwargs.get(name) is not None:
+                raise ValueError(f"{name} is not supported by IslandModel")
+        if ga_kwargs.get('steady_state', False):
+            raise ValueError("steady_state is not supported by IslandModel")
+        self.n_islands = n_islands
+        self.migration_interval = migration_interval
+        self.n_migrants = n_migrants
+        self.n_jobs_per_island = n_jobs_per_island
+        self.mp_context = multiprocessing.get_context() if mp_context is None else mp_context
+        self.ga_kwargs = ga_kwargs
+        self.seeds = np.random.SeedSequence(random_state).spawn(n_islands)
+        self.archive = None
+        self.island = None
+        self.pareto = None
+        self.population = []
+        self.best_individual = None
+        self.hv_history = {}
+        # mirrors GA, whose hypervolume stopping islands do not support
+        self.stopped_generation = None
+        self.saved_evaluations = 0
+
+    def pareto_rows(self):
+        """Rows of evaluated_individuals on the front of all islands' evaluations, in row order."""
+        return sorted(self.pareto.rows)
+
+    @property
+    def evaluated_individuals(self):
+        """Merged DataFrame of every island's archive, with an extra 'island' column."""
+        frame = self.archive.to_frame().copy()
+        frame['island'] = self.island
+        return frame
+
+    def optimize(self):
+        """Runs all islands to max_gens and merges their archives and final populations."""
+        inboxes = [self.mp_context.Queue() for _ in range(self.n_islands)]
+        results = self.mp_context.Queue()
+        processes = [self.mp_context.Process(target=_run_island,
+                                             args=(i, self.n_islands, self.ga_kwargs, self.seeds[i], self.migration_interval,
+                                                   self.n_migrants, self.n_jobs_per_island, inboxes, results))
+                     for i in range(self.n_islands)]
+        for process in processes:
+            process.start()
+
+        # drain the results before joining, so no island blocks on a full pipe
+        reports = {}
+        try:
+            while len(reports) < self.n_islands:
+                try:
+                    island, report = results.get(timeout=1.0)
+                except queue.Empty:
+                    if any(p.exitcode not in (None, 0) for p in processes):
+                        raise RuntimeError("An island process died without reporting.")
+                    continue
+                if isinstance(report, str):
+                    raise RuntimeError(f"Island {island} failed:\n{report}")
+                reports[island] = report
+        finally:
+            if len(reports) < self.n_islands:
+                for process in processes:
+                    process.terminate()
+            for process in processes:
+                process.join()
+
+        total = sum(len(report['genomes']) for report in reports.values())
+        self.archive = Archive(self.ga_kwargs['ind_size'], reports[0]['objective_names'], capacity=max(1, total))
+        self.island = np.empty(total, dtype=np.int64)
+        self.population = []
+        for island in range(self.n_islands):
+            report = reports[island]
+            self.island[len(self.archive):len(self.archive) + len(report['genomes'])] = island
+            self.archive.append(report['genomes'], report['objectives'], report['generation'], report['timestamp'], report['fidelity'])
+            self.population += [Individual(*ind) for ind in report['population']]
+            self.hv_history[island] = report['hv_history']
+            for entry in report['generations']:
+                instrumentation.event('island.generation', island=island, **entry)
+
+        self.pareto = ParetoArchive()
+        full = np.flatnonzero(self.archive.fidelity[:total] == 1.0)
+        self.pareto.extend(self.archive.objectives[full], full.tolist())
+
+        # best individual across islands, by the lexicographic rule of GA.update_best_individual
+        self.best_individual = max(self.population, key=lambda ind: tuple(ind.fitness))
+        instrumentation.event('islands', n_islands=self.n_islands, pop_size=self.ga_kwargs['pop_size'],
+                              max_gens=self.ga_kwargs['max_gens'], evaluations=len(self.archive))
+        print(f"Islands ended after {len(self.archive)} evaluations.")
+        print("Best Individual so far:", self.best_individual.fitness)
@@ -0,0 +1,185 @@
+"""
+Lightweight timers and counters for profiling experiment runs.
+
+Instrumentation is off by default: timer() then returns a shared no-op context manager and
+count() and event() return immediately, so instrumented code only pays a function call.
+enable() starts a Recorder that appends one JSON line per timed span or event to a file and
+keeps running totals for the end-of-run summary table printed by disable().
+
+Only the process that called enable() records; the workers of a process pool are not
+instrumented, the threads of a thread pool are.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+import pandas as pd
+
+
+def _json_default(obj):
+    # NumPy scalars and arrays
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    return str(obj)
+
+
+class Recorder:
+
+    def __init__(self, path=None, **run_info):
+        """
+        Accumulates timer and counter totals and writes structured JSONL records.
+
+        Parameters
+        ----------
+        path : str, optional
+            JSONL file the records are appended to. Totals are only kept in memory if None.
+        **run_info
+            Fields of the opening 'start' record, e.g. the task, experiment and seed.
+        """
+        self.path = path
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.timers = {}  # name -> [calls, total seconds, max seconds]
+        self.counters = {}
+        self.started = time.perf_counter()
+        self.file = None
+        if path is not None:
+            folder = os.path.dirname(path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            self.file = open(path, 'a')
+        self.write({'kind': 'start', 'time': time.time(), **run_info})
+
+    def write(self, record):
+        if self.file is not None:
+            line = json.dumps(record, default=_json_default)
+            with self.lock:
+                self.file.write(line + '\n')
+
+    def add_time(self, name, start, seconds):
+        with self.lock:
+            stats = self.timers.get(name)
+            if stats is None:
+                stats = self.timers[name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+        self.write({'kind': 'timer', 'name': name, 'start': start - self.started, 'seconds': seconds,
+                    'thread': threading.get_ident()})
+
+    def add_count(self, name, n):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self):
+        """
+        DataFrame with one row per timer, sorted by total time: number of calls, total
+        seconds, mean and max milliseconds and the share of the wall time since enable().
+        Timers nest, so shares do not add up to one.
+        """
+        wall = time.perf_counter() - self.started
+        with self.lock:
+            rows = {name: {'calls': calls, 'total_s': total, 'mean_ms': 1000 * total / calls,
+                           'max_ms': 1000 * max_s, 'share': total / wall if wall > 0 else 0.0}
+                    for name, (calls, total, max_s) in self.timers.items()}
+        table = pd.DataFrame.from_dict(rows, orient='index', columns=['calls', 'total_s', 'mean_ms', 'max_ms', 'share'])
+        return table.sort_values('total_s', ascending=False)
+
+    def close(self):
+        """Writes the closing 'summary' record, closes the file and returns summary()."""
+        table = self.summary()
+        self.write({'kind': 'summary', 'wall_s': time.perf_counter() - self.started,
+                    'timers': table.to_dict(orient='index'), 'counters': dict(self.counters)})
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        return table
+
+
+class _Timer:
+    __slots__ = ('recorder', 'name', 'start')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.add_time(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+_recorder = None
+_DISABLED = nullcontext()
+
+
+def active():
+    """The Recorder of this process, or None if instrumentation is off."""
+    recorder = _recorder
+    if recorder is None or recorder.pid != os.getpid():
+        # forked pool workers inherit the module state but must not write to the parent's file
+        return None
+    return recorder
+
+
+def enable(path=None, **run_info):
+    """Starts recording, see Recorder. Replaces (and closes) any active recorder."""
+    global _recorder
+    disable(report=False)
+    _recorder = Recorder(path, **run_info)
+    return _recorder
+
+
+def disable(report=True):
+    """
+    Stops recording. Returns the summary table, also printed with the counters if report,
+    or None if instrumentation was off.
+    """
+    global _recorder
+    recorder = active()
+    _recorder = None
+    if recorder is None:
+        return None
+    table = recorder.close()
+    if report:
+        print(format_summary(table, recorder.counters))
+    return table
+
+
+def timer(name):
+    """Context manager timing the enclosed block under name."""
+    recorder = _recorder
+    if recorder is None or recorder.pid != os.getpid():
+        return _DISABLED
+    return _Timer(recorder, name)
+
+
+def count(name, n=1):
+    """Adds n to the counter name."""
+    recorder = active()
+    if recorder is not None:
+        recorder.add_count(name, n)
+
+
+def event(name, **fields):
+    """Writes a one-off 'event' record, e.g. the end of a generation."""
+    recorder = active()
+    if recorder is not None:
+        recorder.write({'kind': 'event', 'name': name, 'time': time.perf_counter() - recorder.started, **fields})
+
+
+def format_summary(table, counters=None):
+    """Renders a summary() table and counters as plain text."""
+    lines = ['Timing summary:']
+    if len(table) == 0:
+        lines.append('  (no timers recorded)')
+    else:
+        lines.append(table.to_string(float_format=lambda v: f'{v:.3f}'))
+    for name, value in sorted((counters or {}).items()):
+        lines.append(f'{name}: {value}')
+    return '\n'.join(lines)
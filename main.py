@@ -9,6 +9,14 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--metrics', type=str)
     parser.add_argument('--results_folder', type=str, default='Results')
+    parser.add_argument('--n_jobs', type=int, default=1)
+    parser.add_argument('--executor', type=str, default='thread', choices=['thread', 'process'])
+    parser.add_argument('--cache_dir', type=str, default=None)
+    parser.add_argument('--racing_min_folds', type=int, default=None)
+    parser.add_argument('--profile', action='store_true')
+    parser.add_argument('--n_islands', type=int, default=1)
+    parser.add_argument('--migration_interval', type=int, default=5)
+    parser.add_argument('--refit', type=str, default='all', choices=['all', 'front'])
     args = parser.parse_args()
 
     ml_models = [RandomForestClassifier, LogisticRegression, XGBClassifier]
@@ -33,7 +41,15 @@ def main():
                                                    num_runs=20,
                                                    objective_functions=objective_functions_combinations[args.metrics],
                                                    objective_functions_weights=[1, -1],
-                                                   ga_params=gp_params_remote)
+                                                   ga_params=gp_params_remote,
+                                                   n_jobs=args.n_jobs,
+                                                   executor_backend=args.executor,
+                                                   cache_dir=args.cache_dir,
+                                                   racing_min_folds=args.racing_min_folds,
+                                                   profile=args.profile,
+                                                   n_islands=args.n_islands,
+                                                   migration_interval=args.migration_interval,
+                                                   refit=args.refit)
 
     
 if __name__ == '__main__':
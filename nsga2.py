@@ -5,16 +5,145 @@
 # https://github.com/EpistasisLab/StarBASE-GP/blob/main/Source/nsga_tool.py
 #####################################################################################################
 
+import os
 import numpy as np
 from typeguard import typechecked
 from typing import List, Tuple
 import numpy.typing as npt
 
-@typechecked # for debugging purposes
+# NSGA2_DEBUG=1 turns on typeguard and the other runtime contract checks, and cross-checks
+# the fast non-dominated sorting against the pairwise reference
+DEBUG = os.environ.get('NSGA2_DEBUG', '0') == '1'
+
+# populations larger than this are ranked with the two-objective sweep line
+SWEEP_MIN_SIZE = 256
+
+def _debug_typechecked(func):
+    return typechecked(func) if DEBUG else func
+
+@_debug_typechecked
 def non_dominated_sorting(obj_scores: npt.NDArray[float], weights: npt.NDArray[float]) -> Tuple[List[npt.NDArray[int]],npt.NDArray[int]]:
     """
     Perform non-dominated sorting for a maximization problem using NumPy arrays of type float.
 
+    Ranks come from a sweep line for two objectives and a broadcasted domination matrix
+    (in row blocks for large populations) otherwise. Fronts and ranks, including the
+    order of the indices within each front, are identical to the pairwise algorithm.
+
+    Parameters:
+    obj_scores (np.ndarray): A 2D array where each row represents the objective values for a solution.
+
+    Returns:
+    Tuple(fronts, rank):
+    fronts (list of numpy array of int): Each sublist contains the indices of solutions in the corresponding Pareto front.
+    rank (numpy array of int): The front rank of each solution in the population.
+    """
+    if DEBUG:
+        assert all(isinstance(x, np.ndarray) for x in obj_scores)
+        assert isinstance(obj_scores[0][0], (float, np.floating))
+        assert all(len(x) == len(weights) for x in obj_scores)
+
+    # update obj_scores based on weights
+    obj_scores = np.asarray(obj_scores * weights, dtype=float)
+    if len(obj_scores) == 0:
+        return [], np.zeros(0, dtype=int)
+
+    if obj_scores.shape[1] == 2 and len(obj_scores) > SWEEP_MIN_SIZE and not np.isnan(obj_scores).any():
+        rank = _ranks_sweep_2d(obj_scores)
+    else:
+        rank = _ranks_domination_matrix(obj_scores)
+    fronts = _fronts_in_discovery_order(obj_scores, rank)
+
+    if DEBUG:
+        ref_fronts, ref_rank = _non_dominated_sorting_pairwise(obj_scores, np.ones(obj_scores.shape[1]))
+        assert np.array_equal(rank, ref_rank)
+        assert len(fronts) == len(ref_fronts) and all(np.array_equal(a, b) for a, b in zip(fronts, ref_fronts))
+    return fronts, rank
+
+def _domination_matrix(obj_scores_a, obj_scores_b):
+    """D[p, q] is True if row p of obj_scores_a dominates row q of obj_scores_b (maximizing)."""
+    a = obj_scores_a[:, None, :]
+    b = obj_scores_b[None, :, :]
+    return np.all(a >= b, axis=2) & np.any(a > b, axis=2)
+
+def _ranks_domination_matrix(obj_scores, block_size=1024):
+    """Front ranks by peeling fronts off the domination counts of a broadcasted matrix."""
+    pop_size = len(obj_scores)
+    # how many solutions dominate each solution, built in row blocks to bound memory
+    domination_count = np.zeros(pop_size, dtype=int)
+    dominated = [] if pop_size <= block_size else None
+    for begin in range(0, pop_size, block_size):
+        block = _domination_matrix(obj_scores[begin:begin + block_size], obj_scores)
+        domination_count += block.sum(axis=0)
+        if dominated is not None:
+            dominated.append(block)
+    dominated = np.vstack(dominated) if dominated is not None else None
+
+    rank = np.zeros(pop_size, dtype=int)
+    remaining = np.ones(pop_size, dtype=bool)
+    i = 0
+    while remaining.any():
+        front = np.flatnonzero(remaining & (domination_count == 0))
+        rank[front] = i
+        remaining[front] = False
+        # release the solutions dominated by this front
+        if dominated is not None:
+            domination_count -= dominated[front].sum(axis=0)
+        else:
+            for begin in range(0, len(front), block_size):
+                domination_count -= _domination_matrix(obj_scores[front[begin:begin + block_size]], obj_scores).sum(axis=0)
+        i += 1
+    return rank
+
+def _ranks_sweep_2d(obj_scores):
+    """
+    O(n log n) front ranks for two objectives without NaN.
+
+    Solutions are swept by decreasing first, then second objective, so every possible
+    dominator of a solution comes before it. A swept solution q is dominated by a front
+    iff the front's lexicographic maximum of (second, first) objective exceeds q's; these
+    maxima strictly decrease with the front rank, so q's rank is found by bisection.
+    """
+    order = np.lexsort((-obj_scores[:, 1], -obj_scores[:, 0]))
+    keys = list(zip(obj_scores[order, 1].tolist(), obj_scores[order, 0].tolist()))
+    rank = np.empty(len(obj_scores), dtype=int)
+    front_best = []
+    for q, key in zip(order, keys):
+        lo, hi = 0, len(front_best)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if front_best[mid] > key:
+                lo = mid + 1
+            else:
+                hi = mid
+        rank[q] = lo
+        if lo == len(front_best):
+            front_best.append(key)
+        else:
+            front_best[lo] = key
+    return rank
+
+def _fronts_in_discovery_order(obj_scores, rank):
+    """
+    Fronts with their indices in the order the pairwise algorithm appends them: the first
+    front by index, every later solution after its last dominator in the previous front
+    (ties by index).
+    """
+    fronts = [np.flatnonzero(rank == 0)]
+    for i in range(1, int(rank.max()) + 1 if len(rank) > 0 else 0):
+        members = np.flatnonzero(rank == i)
+        previous = fronts[-1]
+        dominated = _domination_matrix(obj_scores[previous], obj_scores[members])
+        # position in the previous front of each member's last dominator there
+        last_dominator = np.where(dominated, np.arange(len(previous))[:, None], -1).max(axis=0)
+        fronts.append(members[np.argsort(last_dominator, kind='stable')])
+    return [np.array(front, dtype=int) for front in fronts]
+
+def _non_dominated_sorting_pairwise(obj_scores: npt.NDArray[float], weights: npt.NDArray[float]) -> Tuple[List[npt.NDArray[int]],npt.NDArray[int]]:
+    """
+    Reference O(n^2) pairwise non-dominated sorting; non_dominated_sorting returns the same
+    fronts and ranks faster, and is checked against this in debug mode.
+
     Parameters:
     obj_scores (np.ndarray): A 2D array where each row represents the objective values for a solution.
 
@@ -71,11 +200,73 @@ def non_dominated_sorting(obj_scores: npt.NDArray[float], weights: npt.NDArray[f
     return fronts, rank
 
 # calculate the crowding distance for all individuals within the population
-@typechecked
+@_debug_typechecked
 def crowding_distance(obj_scores: npt.NDArray[float], count: int, front_map: List[npt.NDArray[int]]) -> npt.NDArray[float]:
     """
     Calculate the crowding distance for each individual in the population.
 
+    All fronts are handled at once: the fronts are concatenated into segments, each
+    objective is sorted by (front, value) with a stable sort, which keeps the mergesort
+    tie order within every front, and the boundary infinities and neighbor differences
+    are array operations on the segments. Bit-identical to the per-element loop.
+
+    Parameters:
+    - obj_scores: List of performances on obj_scores for each individual. We are assuming that the
+                position of scores are the same as the position of the individuals in the population.
+    - count: Number of obj_scores.
+
+    Returns:
+    - crowding_distances: List of crowding distances corresponding to each individual.
+    """
+    if DEBUG:
+        assert all(isinstance(x, np.ndarray) for x in obj_scores)
+        assert isinstance(obj_scores[0][0], (float, np.floating))
+
+    # initialize the crowding distances to negative for guards
+    crowding_distances = np.full(len(obj_scores), -1.0, dtype=float)
+    if len(front_map) == 0:
+        return crowding_distances
+
+    # segment layout of the concatenated fronts
+    members = np.concatenate(front_map).astype(int)
+    sizes = np.array([len(front) for front in front_map])
+    segment = np.repeat(np.arange(len(front_map)), sizes)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    ends = starts + sizes - 1
+    interior = np.ones(len(members), dtype=bool)
+    interior[starts] = False
+    interior[ends] = False
+
+    # set inital front crowding distances to zero for addition
+    crowding_distances[members] = 0.0
+
+    for m in range(count):
+        # sort every front by the m-th objective; lexsort is stable, like mergesort
+        sorted_members = members[np.lexsort((obj_scores[members, m], segment))]
+        values = obj_scores[sorted_members, m]
+
+        # skip fronts whose max and min are the same
+        varying = values[ends] != values[starts]
+
+        # set the crowding distance of boundary points to infinity
+        crowding_distances[sorted_members[starts[varying]]] = np.inf
+        crowding_distances[sorted_members[ends[varying]]] = np.inf
+
+        # calculate crowding distances for intermediate points
+        i = np.flatnonzero(interior & varying[segment])
+        span = values[ends] - values[starts]
+        crowding_distances[sorted_members[i]] += (values[i + 1] - values[i - 1]) / span[segment[i]]
+
+    if DEBUG:
+        # make sure all crowding distances are non-negative
+        assert np.all(crowding_distances >= 0.0)
+
+    return crowding_distances
+
+def _crowding_distance_loop(obj_scores: npt.NDArray[float], count: int, front_map: List[npt.NDArray[int]]) -> npt.NDArray[float]:
+    """
+    Reference per-element loop of crowding_distance, which returns the same distances.
+
     Parameters:
     - obj_scores: List of performances on obj_scores for each individual. We are assuming that the
                 position of scores are the same as the position of the individuals in the population.
@@ -125,7 +316,39 @@ def crowding_distance(obj_scores: npt.NDArray[float], count: int, front_map: Lis
 
     return crowding_distances
 
-@typechecked # for debugging purposes
+def hypervolume(obj_scores: npt.NDArray[float], ref: npt.NDArray[float]) -> float:
+    """
+    Hypervolume dominated by a set of solutions of a maximization problem, bounded by ref.
+
+    Parameters:
+    obj_scores (np.ndarray): A 2D array where each row represents the objective values for a solution.
+    ref (np.ndarray): Reference point; only the parts of the space better than ref in every objective count.
+
+    Returns:
+    float: the hypervolume; exact sweep for two objectives, deap's pyhv for more.
+    """
+    obj_scores = np.asarray(obj_scores, dtype=float).reshape(-1, len(ref))
+    # only solutions strictly better than the reference point contribute
+    obj_scores = obj_scores[np.all(obj_scores > ref, axis=1)]
+    if len(obj_scores) == 0:
+        return 0.0
+
+    if len(ref) != 2:
+        from deap.tools._hypervolume import pyhv
+        # pyhv minimizes, so negate both the solutions and the reference point
+        return float(pyhv.hypervolume([tuple(p) for p in -obj_scores], -np.asarray(ref, dtype=float)))
+
+    # sweep by decreasing first objective; each point adds the slab above the best second objective so far
+    order = np.lexsort((-obj_scores[:, 1], -obj_scores[:, 0]))
+    volume = 0.0
+    best_second = ref[1]
+    for first, second in obj_scores[order]:
+        if second > best_second:
+            volume += (first - ref[0]) * (second - best_second)
+            best_second = second
+    return float(volume)
+
+@_debug_typechecked
 def dominates(solution1: npt.NDArray[float], solution2: npt.NDArray[float]) -> bool:
     """
     Check if solution1 dominates solution2.
@@ -145,7 +368,7 @@ def dominates(solution1: npt.NDArray[float], solution2: npt.NDArray[float]) -> b
 
     return bool(better_in_all and better_in_at_least_one)
 
-@typechecked # for debugging purposes
+@_debug_typechecked
 def non_dominated_binary_tournament(ranks: npt.NDArray[int], distances: npt.NDArray[float], rng: np.random.Generator) -> int:
 
     # make srue that ranks and distances are the same size
@@ -168,7 +391,32 @@ def non_dominated_binary_tournament(ranks: npt.NDArray[int], distances: npt.NDAr
         return int(t1) if ranks[t1] < ranks[t2] else int(t2)
     
 
-@typechecked # for debugging purposes
+@_debug_typechecked
+def non_dominated_binary_tournaments(ranks: npt.NDArray[int], distances: npt.NDArray[float], rng: np.random.Generator, parent_cnt: int) -> npt.NDArray[int]:
+    """
+    Runs parent_cnt binary tournaments at once; same rules as non_dominated_binary_tournament.
+
+    Both contestants of every tournament come from a single integers() call: the second is
+    drawn from the n - 1 other solutions and shifted past the first, which makes them
+    distinct without redrawing, with the same distribution as the rejection loop.
+
+    Returns:
+    numpy array of int: the parent_cnt winners.
+    """
+    # make sure that ranks and distances are the same size
+    assert ranks.shape == distances.shape
+    assert len(ranks) >= 2, "A tournament needs two distinct solutions."
+
+    draws = rng.integers(0, [len(ranks), len(ranks) - 1], size=(parent_cnt, 2))
+    t1 = draws[:, 0]
+    t2 = draws[:, 1] + (draws[:, 1] >= t1)
+
+    # same front: the one with the greatest crowding distance wins; otherwise the lower rank
+    same_front = ranks[t1] == ranks[t2]
+    t1_wins = np.where(same_front, distances[t1] > distances[t2], ranks[t1] < ranks[t2])
+    return np.where(t1_wins, t1, t2).astype(int)
+
+@_debug_typechecked
 def non_dominated_truncate(fronts: List[npt.NDArray[int]], distances: npt.NDArray[float], N) -> npt.NDArray[int]:
     # make sure that fronts and distances are the nonempty
     assert sum([len(x) for x in fronts]) > 0 and len(distances) > 0
@@ -0,0 +1,74 @@
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def test_heartbeat_keeps_silent_run_alive(tmp_path):
+    experimental_setup = pytest.importorskip("experimental_setup")
+
+    stale_after = 0.3
+    heartbeat_path = tmp_path / "heartbeat"
+    stale_seen = []
+    mtimes = []
+    done = threading.Event()
+
+    def watch():
+        while not done.is_set():
+            stale_seen.append(experimental_setup.is_stale_partial_run(str(tmp_path), stale_after))
+            mtimes.append(os.path.getmtime(heartbeat_path))
+            time.sleep(0.02)
+
+    watcher = threading.Thread(target=watch)
+    with experimental_setup.Heartbeat(str(tmp_path), interval=0.05):
+        watcher.start()
+        # a run that writes nothing to save_folder for a known, long enough time
+        time.sleep(3 * stale_after)
+        done.set()
+        watcher.join()
+
+    # the heartbeat file kept being touched, never leaving a stale_after gap
+    beats = sorted(set(mtimes))
+    assert len(beats) >= 3
+    assert max(np.diff(beats)) < stale_after
+    assert len(stale_seen) > 0 and not any(stale_seen)
+    # without the heartbeat the same folder goes stale
+    time.sleep(stale_after + 0.1)
+    assert experimental_setup.is_stale_partial_run(str(tmp_path), stale_after)
+
+
+def _write_toy_dataset(data_dir, name):
+    rng = np.random.default_rng(0)
+    n = 120
+    X = pd.DataFrame({"x1": rng.normal(size=n), "x2": rng.normal(size=n),
+                      "sex": rng.integers(0, 2, n).astype(float), "race": rng.integers(0, 2, n).astype(float)})
+    y = pd.Series((X["x1"] + 0.5 * X["sex"] + rng.normal(scale=0.5, size=n) > 0).astype(int))
+    with open(f"{data_dir}/{name}_True.pkl", "wb") as f:
+        pickle.dump({"X": X, "y": y, "features": list(X.columns), "sens_features": ["sex", "race"]}, f)
+
+
+@pytest.mark.parametrize("n_islands", [1, 2])
+def test_evolved_weights_scores_keep_run_metadata(tmp_path, monkeypatch, n_islands):
+    experimental_setup = pytest.importorskip("experimental_setup")
+    from sklearn.tree import DecisionTreeClassifier
+
+    _write_toy_dataset(tmp_path, "toy")
+    # skip the random start-up delay
+    monkeypatch.setattr(experimental_setup.random, "random", lambda: 0.0)
+    ga_params = {"pop_size": 4, "max_gens": 2, "mut_rate": 0.2, "cross_rate": 0.8}
+    experimental_setup.compare_reweighting_methods([DecisionTreeClassifier], ["Evolved Weights"], ["toy"], str(tmp_path / "results"),
+                                                   str(tmp_path), 1, ["accuracy", "subgroup_FNR_loss"], [1, -1], ga_params, stale_after=None,
+                                                   n_islands=n_islands, migration_interval=1)
+
+    with open(tmp_path / "results" / "DecisionTreeClassifier" / "toy_0_Evolved Weights" / "scores.pkl", "rb") as f:
+        scores = pickle.load(f)
+    # islands share the budget of a single GA
+    assert len(scores) == 4 * 2
+    assert scores["stopped_generation"].isna().all()
+    assert (scores["saved_evaluations"] == 0).all()
+    # no racing, so every individual was scored on all folds
+    assert (scores["cv_fidelity"] == 1.0).all()
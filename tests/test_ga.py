@@ -1,6 +1,7 @@
 import numpy as np
+import pytest
 
-from ga import GA
+from ga import GA, BatchFitness
 
 
 def _fitness_sum_pair(program):
@@ -59,3 +60,507 @@ def test_ga_step_optimize_nsga_mode_runs():
 
     assert len(ga.population) == 4
     assert all(ind.fitness is not None for ind in ga.population)
+
+
+def test_ga_batched_evaluation_with_executor_matches_serial():
+    from concurrent.futures import ThreadPoolExecutor
+
+    def run(executor):
+        ga = GA(
+            ind_size=4,
+            pop_size=6,
+            max_gens=3,
+            random_state=3,
+            mut_rate=0.2,
+            cross_rate=0.8,
+            fitness_func=_fitness_sum_pair,
+            use_nsga=True,
+            executor=executor,
+        )
+        ga.optimize()
+        return ga.evaluated_individuals[['perf_fitness', 'fair_fitness']].to_numpy()
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        parallel = run(executor)
+    np.testing.assert_array_equal(parallel, run(None))
+
+
+def test_ga_batch_fitness_func_receives_weight_matrix():
+    shapes = []
+
+    def batch_fitness(programs):
+        shapes.append(programs.shape)
+        return np.column_stack([programs.sum(axis=1), -programs.sum(axis=1)])
+
+    ga = GA(
+        ind_size=3,
+        pop_size=5,
+        max_gens=2,
+        random_state=0,
+        mut_rate=0.1,
+        cross_rate=0.5,
+        fitness_func=None,
+        use_nsga=False,
+        batch_fitness_func=batch_fitness,
+    )
+    ga.initialize_population()
+    ga.step_optimize()
+
+    assert shapes == [(5, 3), (5, 3)]
+    assert all(len(ind.fitness) == 2 for ind in ga.population)
+
+
+def test_archive_grows_and_exports_in_chunks(tmp_path):
+    from ga import Archive
+
+    archive = Archive(ind_size=3, capacity=2)
+    for generation in range(1, 4):
+        programs = np.full((2, 3), float(generation))
+        archive.append(programs, np.column_stack([programs.sum(axis=1), -programs.sum(axis=1)]), generation)
+
+    frame = archive.to_frame()
+    assert len(archive) == 6
+    assert list(frame.columns) == ['individual', 'perf_fitness', 'fair_fitness', 'generation', 'timestamp', 'fidelity']
+    assert frame.loc[5, 'generation'] == 3
+    np.testing.assert_array_equal(frame.loc[4, 'individual'], [3.0, 3.0, 3.0])
+
+    next_start = archive.export(tmp_path, chunk_size=4)
+    assert next_start == 6
+    assert len(list(tmp_path.iterdir())) == 2
+
+    loaded = Archive.load(tmp_path)
+    np.testing.assert_array_equal(loaded.genomes[:len(loaded)], archive.genomes[:len(archive)])
+    np.testing.assert_array_equal(loaded.objectives[:len(loaded)], archive.objectives[:len(archive)])
+
+
+def test_fitness_cache_ignores_empty_cells_and_counts_hits():
+    from ga import FitnessCache
+
+    calls = []
+
+    def batch_fitness(programs):
+        calls.append(len(programs))
+        return np.column_stack([programs[:, 0], programs[:, 1]])
+
+    cache = FitnessCache(present_cells=[True, True, False])
+    programs = np.array([
+        [1.0, 2.0, 0.5],
+        [1.0, 2.0, 1.5],  # differs only in an empty cell
+        [2.0, 1.0, 0.5],
+    ])
+
+    fitness = cache.evaluate(programs, batch_fitness)
+    np.testing.assert_array_equal(fitness, [[1.0, 2.0], [1.0, 2.0], [2.0, 1.0]])
+    assert calls == [2]
+
+    cache.evaluate(programs[:1], batch_fitness)
+    assert calls == [2]
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 2
+
+
+def test_ga_with_fitness_cache_matches_uncached_run():
+    from ga import FitnessCache
+
+    def run(fitness_cache):
+        ga = GA(
+            ind_size=4,
+            pop_size=6,
+            max_gens=4,
+            random_state=7,
+            mut_rate=0.1,
+            cross_rate=0.8,
+            fitness_func=_fitness_sum_pair,
+            use_nsga=True,
+            fitness_cache=fitness_cache,
+        )
+        ga.optimize()
+        return ga.evaluated_individuals[['perf_fitness', 'fair_fitness']].to_numpy()
+
+    np.testing.assert_array_equal(run(FitnessCache()), run(None))
+
+
+def test_ga_vary_operators():
+    ga = GA(
+        ind_size=5,
+        pop_size=4,
+        max_gens=2,
+        random_state=0,
+        mut_rate=0.0,
+        cross_rate=0.0,
+        fitness_func=_fitness_sum_pair,
+    )
+    parents_a = np.full((4, 5), 0.5)
+    parents_b = np.full((4, 5), 1.5)
+
+    # neither crossover nor mutation: children copy parent a
+    np.testing.assert_array_equal(ga.vary(parents_a, parents_b), parents_a)
+
+    # crossover only: every gene comes from one of the parents
+    ga.cross_rate = 1.0
+    children = ga.vary(parents_a, parents_b)
+    assert np.all((children == 0.5) | (children == 1.5))
+
+    # mutation of every gene stays within [0, 2]
+    ga.mut_rate = 1.0
+    children = ga.vary(parents_a, parents_b)
+    assert np.all((children >= 0) & (children <= 2))
+
+
+@pytest.mark.parametrize("use_nsga", [True, False])
+def test_ga_vectorized_variation_runs(use_nsga):
+    ga = GA(
+        ind_size=4,
+        pop_size=6,
+        max_gens=3,
+        random_state=4,
+        mut_rate=0.2,
+        cross_rate=0.8,
+        fitness_func=_fitness_sum_pair,
+        use_nsga=use_nsga,
+        variation='vectorized',
+    )
+    ga.optimize()
+
+    assert len(ga.population) == 6
+    assert len(ga.evaluated_individuals) == 18
+
+
+def test_ga_resumes_bit_exactly_from_checkpoint(tmp_path):
+    def make_ga(max_gens, checkpoint_dir):
+        return GA(
+            ind_size=4,
+            pop_size=6,
+            max_gens=max_gens,
+            random_state=5,
+            mut_rate=0.2,
+            cross_rate=0.8,
+            fitness_func=_fitness_sum_pair,
+            use_nsga=True,
+            checkpoint_dir=checkpoint_dir,
+        )
+
+    uninterrupted = make_ga(5, None)
+    uninterrupted.optimize()
+
+    # a run preempted after generation 3, then restarted with the full budget
+    make_ga(3, str(tmp_path)).optimize()
+    resumed = make_ga(5, str(tmp_path))
+    resumed.optimize()
+
+    assert resumed.generation == 5
+    np.testing.assert_array_equal(resumed.archive.genomes[:len(resumed.archive)], uninterrupted.archive.genomes[:len(uninterrupted.archive)])
+    assert [ind.fitness for ind in resumed.population] == [ind.fitness for ind in uninterrupted.population]
+
+
+@pytest.mark.parametrize("n_workers", [None, 3])
+def test_ga_steady_state_uses_same_evaluation_budget(n_workers):
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = None if n_workers is None else ThreadPoolExecutor(max_workers=n_workers)
+    ga = GA(
+        ind_size=4,
+        pop_size=6,
+        max_gens=4,
+        random_state=6,
+        mut_rate=0.2,
+        cross_rate=0.8,
+        fitness_func=_fitness_sum_pair,
+        use_nsga=True,
+        executor=executor,
+        steady_state=True,
+    )
+    ga.optimize()
+    if executor is not None:
+        executor.shutdown()
+
+    assert len(ga.evaluated_individuals) == 6 * 4
+    assert len(ga.population) == 6
+    assert ga.evaluated_individuals['generation'].max() == 4
+
+
+@pytest.mark.parametrize("option", [{"checkpoint_dir": "checkpoint"}, {"hv_tol": 1e-3}, {"surrogate": "surrogate"},
+                                    {"fitness_func": None, "batch_fitness_func": BatchFitness(_fitness_sum_pair)}])
+def test_ga_steady_state_rejects_unsupported_options(option):
+    if "surrogate" in option:
+        from ga import SurrogateScreen
+        option = {"surrogate": SurrogateScreen()}
+    option = {"fitness_func": _fitness_sum_pair, **option}
+    with pytest.raises(ValueError):
+        GA(ind_size=3, pop_size=4, max_gens=3, random_state=0, mut_rate=0.2, cross_rate=0.8,
+           use_nsga=True, steady_state=True, **option)
+
+
+def test_ga_surrogate_screening_saves_evaluations():
+    from ga import SurrogateScreen
+
+    surrogate = SurrogateScreen(oversample=3, random_state=0)
+    ga = GA(
+        ind_size=4,
+        pop_size=6,
+        max_gens=5,
+        random_state=8,
+        mut_rate=0.2,
+        cross_rate=0.8,
+        fitness_func=_fitness_sum_pair,
+        use_nsga=True,
+        surrogate=surrogate,
+    )
+    ga.optimize()
+
+    summary = surrogate.summary()
+    assert summary['generations'] > 0
+    assert summary['n_real'] + summary['n_saved'] == 6 * summary['generations']
+    assert len(ga.evaluated_individuals) == 6 * 5 - summary['n_saved']
+    assert len(ga.population) == 6
+
+
+def test_ga_stops_when_hypervolume_stagnates():
+    def constant_fitness(program):
+        return (1.0, -1.0)
+
+    ga = GA(
+        ind_size=3,
+        pop_size=4,
+        max_gens=20,
+        random_state=0,
+        mut_rate=0.1,
+        cross_rate=0.5,
+        fitness_func=constant_fitness,
+        use_nsga=True,
+        hv_tol=1e-6,
+        hv_patience=2,
+        hv_ref=[0.0, -2.0],
+    )
+    ga.optimize()
+
+    assert ga.stopped_generation == 3
+    assert ga.saved_evaluations == (20 - 3) * 4
+    assert len(ga.evaluated_individuals) == 3 * 4
+    assert ga.hv_history == [1.0, 1.0, 1.0]
+
+
+def test_ga_zero_hypervolume_never_stagnates():
+    def constant_fitness(program):
+        return (1.0, -1.0)
+
+    # no individual beats this reference point, so the hypervolume stays 0
+    ga = GA(ind_size=3, pop_size=4, max_gens=6, random_state=0, mut_rate=0.1, cross_rate=0.5,
+            fitness_func=constant_fitness, use_nsga=True, hv_tol=1e-6, hv_patience=2, hv_ref=[2.0, 0.0])
+    ga.optimize()
+
+    assert ga.stopped_generation is None
+    assert ga.hv_history == [0.0] * 6
+
+
+def test_ga_default_hv_ref_ignores_nan():
+    def nan_fitness(program):
+        return (np.nan, -1.0) if program[0] > 0.5 else (float(program[1]), -1.0)
+
+    ga = GA(ind_size=3, pop_size=8, max_gens=1, random_state=0, mut_rate=0.1, cross_rate=0.5,
+            fitness_func=nan_fitness, use_nsga=True)
+    ga.initialize_population()
+    ga.track_hypervolume()
+
+    assert np.all(np.isfinite(ga.hv_ref))
+
+
+def test_ga_races_offspring_against_full_fidelity_front():
+    class ToyRacing:
+        reports_fidelity = True
+
+        def __init__(self):
+            self.front = None
+            self.fronts_seen = 0
+
+        def update_front(self, front_scores):
+            self.front = None if front_scores is None else np.asarray(front_scores)
+            self.fronts_seen += 1
+
+        def __call__(self, program):
+            f0, f1 = program[0], -program[1]
+            if self.front is not None and np.any((self.front[:, 0] > f0) & (self.front[:, 1] > f1)):
+                return (f0, f1, 0.5)
+            return (f0, f1, 1.0)
+
+    racing = ToyRacing()
+    ga = GA(
+        ind_size=3,
+        pop_size=6,
+        max_gens=4,
+        random_state=2,
+        mut_rate=0.3,
+        cross_rate=0.8,
+        fitness_func=racing,
+        use_nsga=True,
+    )
+    ga.optimize()
+
+    evaluated = ga.evaluated_individuals
+    assert racing.fronts_seen == 3
+    assert set(evaluated['fidelity']) <= {0.5, 1.0}
+    assert (evaluated.loc[evaluated['generation'] == 1, 'fidelity'] == 1.0).all()
+    assert all(len(ind.fitness) == 2 for ind in ga.population)
+    # a stopped individual is dominated, so the first front holds full estimates only
+    scores = np.array([ind.fitness for ind in ga.population])
+    import nsga2
+    fronts, _ = nsga2.non_dominated_sorting(obj_scores=scores, weights=np.ones(2))
+    assert all(ga.population[i].fidelity == 1.0 for i in fronts[0])
+
+    with pytest.raises(ValueError):
+        GA(ind_size=3, pop_size=6, max_gens=4, random_state=2, mut_rate=0.3, cross_rate=0.8,
+           fitness_func=racing, use_nsga=True, steady_state=True)
+
+
+def test_island_model_merges_archives_and_migrates(tmp_path):
+    import json
+    import instrumentation
+    from ga import IslandModel
+
+    islands = IslandModel(
+        n_islands=3,
+        migration_interval=2,
+        random_state=5,
+        n_migrants=2,
+        ind_size=4,
+        pop_size=6,
+        max_gens=5,
+        mut_rate=0.2,
+        cross_rate=0.8,
+        fitness_func=_fitness_sum_pair,
+        use_nsga=True,
+    )
+    instrumentation.enable(str(tmp_path / "timings.jsonl"))
+    try:
+        islands.optimize()
+    finally:
+        instrumentation.disable(report=False)
+
+    evaluated = islands.evaluated_individuals
+    # migrants are evaluated once, on their home island
+    assert len(evaluated) == 3 * 6 * 5
+    assert sorted(evaluated['island'].unique()) == [0, 1, 2]
+    assert (evaluated.groupby('island')['generation'].max() == 5).all()
+    assert len(islands.population) == 3 * 6
+    assert all(len(history) == 5 for history in islands.hv_history.values())
+    # island generations are recorded as events of the parent process
+    with open(tmp_path / "timings.jsonl") as f:
+        events = [record for record in map(json.loads, f) if record['kind'] == 'event']
+    assert len([e for e in events if e['name'] == 'island.generation']) == 3 * 5
+    assert [e['evaluations'] for e in events if e['name'] == 'islands'] == [3 * 6 * 5]
+    # different seeds give different initial populations
+    first = evaluated[evaluated['generation'] == 1]
+    assert not np.array_equal(np.vstack(first[first['island'] == 0]['individual']), np.vstack(first[first['island'] == 1]['individual']))
+
+    with pytest.raises(ValueError):
+        IslandModel(n_islands=2, migration_interval=2, random_state=0, ind_size=4, pop_size=6, max_gens=5,
+                    mut_rate=0.2, cross_rate=0.8, fitness_func=_fitness_sum_pair, use_nsga=True, checkpoint_dir='x')
+
+
+def test_ga_immigrate_keeps_population_size():
+    ga = GA(ind_size=3, pop_size=5, max_gens=2, random_state=1, mut_rate=0.2, cross_rate=0.8,
+            fitness_func=_fitness_sum_pair, use_nsga=True)
+    ga.initialize_population()
+    migrants = ga.emigrants(2)
+    assert 1 <= len(migrants) <= 2
+
+    ga.immigrate([(np.full(3, 10.0), (30.0, -29.0), 1.0)])
+    assert len(ga.population) == 5
+    assert any(ind.fitness == (30.0, -29.0) for ind in ga.population)
+    assert len(ga.archive) == 5
+
+
+def test_epsilon_lexicase_select_matches_per_call_selection():
+    from ga import Individual, epsilon_lexicase_pool, epsilon_lexicase_select
+
+    rng = np.random.default_rng(0)
+    fitness = np.round(rng.normal(size=(12, 2)), 1)
+    ga = GA(ind_size=2, pop_size=12, max_gens=1, random_state=0, mut_rate=0.1, cross_rate=0.5, fitness_func=_fitness_sum_pair)
+    ga.population = [Individual(np.zeros(2), tuple(f)) for f in fitness]
+
+    # every parent comes from the pool of one of the two case orders
+    allowed = set(epsilon_lexicase_pool(fitness, [0, 1])) | set(epsilon_lexicase_pool(fitness, [1, 0]))
+    parent_ids = epsilon_lexicase_select(fitness, 4000, np.random.default_rng(1))
+    assert parent_ids.shape == (4000,)
+    assert set(parent_ids) == allowed
+
+    # same distribution as repeated calls of GA.selection
+    index = {id(ind): i for i, ind in enumerate(ga.population)}
+    per_call = [index[id(ga.selection())] for _ in range(4000)]
+    batched = np.bincount(parent_ids, minlength=12) / 4000
+    np.testing.assert_allclose(batched, np.bincount(per_call, minlength=12) / 4000, atol=0.05)
+    assert all(parent in ga.population for parent in ga.select_parents(10))
+
+
+def test_pareto_archive_prunes_and_updates_hypervolume():
+    import nsga2
+    from ga import ParetoArchive
+
+    rng = np.random.default_rng(3)
+    points = np.round(rng.normal(size=(200, 2)), 1)
+    ref = np.array([-1.0, -1.0])
+    pareto = ParetoArchive(ref)
+    for row, (first, second) in enumerate(points):
+        pareto.insert(first, second, row)
+        if row % 50 == 0:
+            assert np.isclose(pareto.hypervolume, nsga2.hypervolume(points[:row + 1], ref))
+
+    fronts, _ = nsga2.non_dominated_sorting(points, np.ones(2))
+    np.testing.assert_array_equal(pareto.front(), np.unique(points[fronts[0]], axis=0))
+    assert np.all(np.diff(pareto.second) < 0)
+    np.testing.assert_array_equal(points[pareto.rows], pareto.front())
+    assert np.isclose(pareto.hypervolume, nsga2.hypervolume(points, ref))
+
+    # a dominated point and a duplicate do not change the front
+    assert not pareto.insert(pareto.first[0] - 1.0, pareto.second[0])
+    assert not pareto.insert(pareto.first[0], pareto.second[0], row=-1)
+    assert -1 not in pareto.rows
+
+
+def test_ga_pareto_archive_tracks_front_of_all_evaluations():
+    import utils
+
+    ga = GA(ind_size=4, pop_size=6, max_gens=4, random_state=9, mut_rate=0.3, cross_rate=0.8,
+            fitness_func=lambda p: (float(p[0] + p[1]), float(-p[0] * p[2])), use_nsga=True)
+    ga.optimize()
+
+    evaluated = ga.evaluated_individuals
+    # utils.front minimizes, so negate the maximized fitness
+    expected = utils.front(-evaluated['perf_fitness'].to_numpy(), -evaluated['fair_fitness'].to_numpy())
+    scores = evaluated[['perf_fitness', 'fair_fitness']].to_numpy()
+    np.testing.assert_array_equal(np.unique(scores[ga.pareto_rows()], axis=0), np.unique(scores[expected], axis=0))
+    assert ga.pareto.ref == tuple(ga.hv_ref)
+    assert ga.pareto.hypervolume >= ga.hv_history[-1]
+
+
+def test_ga_fitness_cache_only_keeps_full_fidelity_racing_results():
+    from ga import FitnessCache
+
+    class StopEverything:
+        reports_fidelity = True
+
+        def __init__(self):
+            self.front = None
+
+        def update_front(self, front_scores):
+            self.front = front_scores
+
+        def __call__(self, program):
+            return (float(program[0]), float(program[1]), 0.5 if self.front is not None else 1.0)
+
+    racing = StopEverything()
+    cache = FitnessCache()
+    ga = GA(ind_size=3, pop_size=4, max_gens=3, random_state=0, mut_rate=0.2, cross_rate=0.8,
+            fitness_func=racing, use_nsga=True, fitness_cache=cache)
+    ga.optimize()
+
+    evaluated = ga.evaluated_individuals
+    assert (evaluated['fidelity'] < 1.0).any()
+    # only the full-fidelity initial population is cached
+    assert all(value[-1] == 1.0 for value in cache.cache.values())
+    assert len(cache.cache) == len(np.unique(np.vstack(evaluated.loc[evaluated['fidelity'] == 1.0, 'individual']), axis=0))
+
+    # a partial estimate is evaluated (and raced) again for a repeated genome
+    program = np.vstack(evaluated.loc[evaluated['fidelity'] < 1.0, 'individual'])[:1]
+    misses = cache.misses
+    cache.evaluate(program, ga.batch_fitness_func, lambda row: row[-1] == 1.0)
+    assert cache.misses == misses + 1
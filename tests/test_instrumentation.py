@@ -0,0 +1,46 @@
+import json
+
+import numpy as np
+
+import instrumentation
+from ga import GA
+
+
+def _fitness_sum_pair(program):
+    s = float(np.sum(program))
+    return (s, -s)
+
+
+def test_disabled_instrumentation_is_a_no_op():
+    assert instrumentation.active() is None
+    with instrumentation.timer('anything'):
+        pass
+    instrumentation.count('anything')
+    instrumentation.event('anything', value=1)
+    assert instrumentation.disable() is None
+
+
+def test_enabled_instrumentation_writes_jsonl_and_summary(tmp_path):
+    path = tmp_path / 'run' / 'timings.jsonl'
+    instrumentation.enable(str(path), task='toy')
+    try:
+        ga = GA(ind_size=3, pop_size=4, max_gens=3, random_state=0, mut_rate=0.2, cross_rate=0.8,
+                fitness_func=_fitness_sum_pair, use_nsga=True)
+        ga.optimize()
+        instrumentation.count('extra', 2)
+    finally:
+        table = instrumentation.disable(report=False)
+
+    assert instrumentation.active() is None
+    assert table.loc['ga.generation', 'calls'] == 3
+    assert table.loc['ga.evaluate', 'calls'] == 3
+    assert table.loc['nsga.sort', 'calls'] == 4
+    assert (table['total_s'] >= 0).all()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert records[0]['kind'] == 'start' and records[0]['task'] == 'toy'
+    assert records[-1]['kind'] == 'summary'
+    assert records[-1]['counters'] == {'ga.individuals': 12, 'extra': 2}
+    generations = [r['generation'] for r in records if r['kind'] == 'event' and r['name'] == 'generation']
+    assert generations == [1, 2, 3]
+    assert sum(r['kind'] == 'timer' for r in records) == sum(table['calls'])
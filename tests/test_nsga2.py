@@ -29,6 +29,32 @@ def test_non_dominated_sorting():
     assert 3 in fronts[0]  # [2,2] should be non-dominated
 
 
+def _assert_same_sorting(scores, weights):
+    fronts, ranks = nsga.non_dominated_sorting(scores, weights)
+    ref_fronts, ref_ranks = nsga._non_dominated_sorting_pairwise(scores, weights)
+    np.testing.assert_array_equal(ranks, ref_ranks)
+    assert len(fronts) == len(ref_fronts)
+    for front, ref_front in zip(fronts, ref_fronts):
+        np.testing.assert_array_equal(front, ref_front)
+
+
+def test_fast_non_dominated_sorting_matches_pairwise(monkeypatch):
+    rng = np.random.default_rng(0)
+    # coarse rounding makes ties and duplicates, which must keep the pairwise front order
+    for n_obj in (2, 3):
+        scores = np.round(rng.normal(size=(60, n_obj)), 1)
+        scores = np.vstack([scores, scores[:10]])
+        _assert_same_sorting(scores, np.ones(n_obj))
+        _assert_same_sorting(scores, np.array([1.0, -1.0, 1.0])[:n_obj])
+
+    # large enough for the two-objective sweep line, with a NaN (matrix engine)
+    monkeypatch.setattr(nsga, "SWEEP_MIN_SIZE", 50)
+    scores = np.round(rng.normal(size=(80, 2)), 1)
+    _assert_same_sorting(scores, np.ones(2))
+    scores[3, 0] = np.nan
+    _assert_same_sorting(scores, np.ones(2))
+
+
 def test_crowding_distance_per_front():
     scores = np.array([
         [1.0, 1.0],
@@ -45,6 +71,24 @@ def test_crowding_distance_per_front():
     assert np.isfinite(distances).any()
 
 
+def test_vectorized_crowding_distance_matches_loop():
+    rng = np.random.default_rng(1)
+    for n_obj in (2, 3):
+        # rounding creates ties, so the mergesort tie order matters for the boundaries
+        scores = np.round(rng.normal(size=(50, n_obj)), 1)
+        scores = np.vstack([scores, scores[:8]])
+        fronts, _ = nsga.non_dominated_sorting(scores, np.ones(n_obj))
+        np.testing.assert_array_equal(nsga.crowding_distance(scores, n_obj, fronts),
+                                      nsga._crowding_distance_loop(scores, n_obj, fronts))
+
+    # single-member fronts and fronts constant in one objective
+    scores = np.array([[1.0, 5.0], [1.0, 4.0], [1.0, 3.0], [0.0, 0.0]])
+    fronts = [np.array([2, 0, 1]), np.array([3])]
+    distances = nsga.crowding_distance(scores, 2, fronts)
+    np.testing.assert_array_equal(distances, nsga._crowding_distance_loop(scores, 2, fronts))
+    np.testing.assert_array_equal(distances, [np.inf, 1.0, np.inf, 0.0])
+
+
 def test_non_dominated_binary_tournament_prefers_rank():
     rng = np.random.default_rng(0)
     ranks = np.array([0, 1, 2, 3])
@@ -52,3 +96,28 @@ def test_non_dominated_binary_tournament_prefers_rank():
 
     winner = nsga.non_dominated_binary_tournament(ranks, distances, rng)
     assert winner in range(len(ranks))
+
+
+def test_hypervolume_two_objectives():
+    scores = np.array([
+        [1.0, 3.0],
+        [2.0, 2.0],
+        [3.0, 1.0],
+        [1.0, 1.0],  # dominated, adds nothing
+    ])
+
+    assert nsga.hypervolume(scores, np.array([0.0, 0.0])) == 6.0
+    assert nsga.hypervolume(scores, np.array([5.0, 5.0])) == 0.0
+
+
+def test_batched_binary_tournaments_follow_tournament_rules():
+    ranks = np.array([0, 0, 1, 2])
+    distances = np.array([np.inf, 0.5, np.inf, 1.0])
+    winners = nsga.non_dominated_binary_tournaments(ranks, distances, np.random.default_rng(0), 20000)
+
+    assert winners.shape == (20000,)
+    # contestants are always distinct, so index 3 never wins
+    counts = np.bincount(winners, minlength=4) / 20000
+    assert counts[3] == 0.0
+    # P(win) over the 6 equally likely distinct pairs: 0 wins 3/6, 1 wins 2/6, 2 wins 1/6
+    np.testing.assert_allclose(counts[:3], [3 / 6, 2 / 6, 1 / 6], atol=0.02)
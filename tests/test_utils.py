@@ -43,6 +43,45 @@ def test_front_simple():
     assert set(front) == {0, 1, 2}
 
 
+def test_front_matches_check_dominance_with_ties():
+    utils = pytest.importorskip("utils")
+    rng = np.random.default_rng(3)
+    obj1 = rng.integers(0, 5, size=100).astype(float)
+    obj2 = rng.integers(0, 5, size=100).astype(float)
+
+    expected = [
+        i for i in range(100)
+        if not any(utils.check_dominance((obj1[j], obj2[j]), (obj1[i], obj2[i])) == 1 for j in range(100))
+    ]
+    result = utils.front(obj1, obj2)
+
+    assert sorted(result) == expected
+    assert list(obj2[result]) == sorted(obj2[result])
+
+    # infinite objectives follow check_dominance too
+    assert utils.front([0.], [np.inf]) == [0]
+    assert utils.front([0., 4., 2.], [np.inf, 3., 0.]) == [2, 0]
+    obj1 = rng.choice([-np.inf, 0., 1., np.inf], size=60)
+    obj2 = rng.choice([-np.inf, 0., 1., np.inf], size=60)
+    expected = [
+        i for i in range(60)
+        if not any(utils.check_dominance((obj1[j], obj2[j]), (obj1[i], obj2[i])) == 1 for j in range(60))
+    ]
+    assert sorted(utils.front(obj1, obj2)) == expected
+
+
+def test_pareto_front_three_objectives():
+    utils = pytest.importorskip("utils")
+    scores = np.array([
+        [1.0, 2.0, 3.0],
+        [2.0, 1.0, 3.0],
+        [2.0, 2.0, 3.0],
+        [1.0, 2.0, 3.0],
+    ])
+
+    assert sorted(utils.pareto_front(scores)) == [0, 1, 3]
+
+
 def test_subgroup_FNR_loss_expected_value():
     utils = pytest.importorskip("utils")
     sample_df = pd.DataFrame(
@@ -68,3 +107,214 @@ def test_subgroup_FNR_loss_expected_value():
 
     result = utils.subgroup_FNR_loss(X, y, y_pred, sens_features=["a", "b"])
     assert result == pytest.approx(0.042857142857142864, rel=1e-12)
+
+
+@pytest.mark.parametrize("metric", ["FNR", "FPR"])
+def test_subgroup_loss_from_codes_matches_subgroup_loss(metric):
+    utils = pytest.importorskip("utils")
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.integers(0, 2, size=(200, 3)), columns=["a", "b", "c"])
+    y = pd.Series(rng.integers(0, 2, size=200))
+    y_pred = rng.integers(0, 2, size=200)
+
+    codes, n_groups = utils.encode_groups(X)
+    expected = utils.subgroup_loss(y.copy(), y_pred, X, metric)
+
+    assert utils.subgroup_loss_from_codes(y, y_pred, codes, metric, n_groups) == expected
+
+
+def test_demographic_parity_difference_matches_fairlearn():
+    utils = pytest.importorskip("utils")
+    rng = np.random.default_rng(1)
+    X = pd.DataFrame(rng.integers(0, 2, size=(300, 3)).astype(float), columns=["a", "b", "c"])
+    y = rng.integers(0, 2, size=300)
+    y_pred = rng.integers(0, 2, size=300)
+
+    fast = utils.demographic_parity_difference(y, y_pred, X, ["a", "b", "c"])
+    reference = utils.demographic_parity_difference(y, y_pred, X, ["a", "b", "c"], use_fairlearn=True)
+
+    assert fast == reference
+
+
+def test_cell_index_matches_binary_to_decimal():
+    utils = pytest.importorskip("utils")
+    rng = np.random.default_rng(2)
+    X = pd.DataFrame(rng.integers(0, 2, size=(50, 3)).astype(float), columns=["a", "b", "c"])
+    y = pd.Series(rng.integers(0, 2, size=50))
+
+    cells = utils.cell_index(X, y, ["a", "c"])
+    expected = [utils.binary_to_decimal([X.loc[i, "a"], X.loc[i, "c"], y[i]]) for i in range(50)]
+    assert cells.tolist() == expected
+
+    partial_weights = np.arange(8, dtype=float)
+    np.testing.assert_array_equal(utils.partial_to_full_sample_weight(partial_weights, X, y, ["a", "c"], cells), partial_weights[expected])
+
+
+def test_calc_weights_non_binary_levels():
+    utils = pytest.importorskip("utils")
+    X = pd.DataFrame({"race": ["a", "a", "b", "b", "c", "c"], "x": [0, 1, 2, 3, 4, 5]})
+    y = pd.Series([1, 0, 1, 1, 0, 0])
+
+    weights = utils.calc_weights(X, y, ["race"])
+
+    # expected/observed count of each (race, label) cell, e.g. (b, 1): 2*3/(6*2)
+    np.testing.assert_allclose(weights, [1.0, 1.0, 0.5, 0.5, 0.5, 0.5])
+
+
+def _toy_task(n=120, seed=4):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        "a": rng.integers(0, 2, size=n).astype(float),
+        "b": rng.integers(0, 2, size=n).astype(float),
+        "x": rng.normal(size=n),
+    })
+    y = pd.Series((X["x"] + 0.5*X["a"] + rng.normal(scale=0.5, size=n) > 0).astype(int))
+    return X, y
+
+
+def test_fold_cache_matches_uncached_cross_val_scorer():
+    utils = pytest.importorskip("utils")
+    from sklearn.model_selection import StratifiedKFold
+    from sklearn.tree import DecisionTreeClassifier
+
+    X, y = _toy_task()
+    skf = StratifiedKFold(n_splits=5, random_state=0, shuffle=True)
+    fold_cache = utils.FoldCache(skf, X, y, ["a", "b"])
+    weights = np.linspace(0.5, 1.5, 8)
+    objectives = ["accuracy", "subgroup_FNR_loss"]
+
+    assert len(fold_cache) == 5
+    for fold, (train_index, test_index) in zip(fold_cache, skf.split(X, y)):
+        np.testing.assert_array_equal(fold.test_index, test_index)
+        np.testing.assert_array_equal(fold.X_train, X.iloc[train_index].to_numpy())
+
+    cached = utils.cross_val_scorer(weights, skf, DecisionTreeClassifier(random_state=0), X, y, ["a", "b"], objectives, fold_cache=fold_cache)
+    uncached = utils.cross_val_scorer(weights, skf, DecisionTreeClassifier(random_state=0), X, y, ["a", "b"], objectives)
+    assert cached == uncached
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_cross_val_scorer_parallel_matches_serial(backend):
+    utils = pytest.importorskip("utils")
+    from sklearn.model_selection import StratifiedKFold
+    from sklearn.tree import DecisionTreeClassifier
+
+    X, y = _toy_task()
+    skf = StratifiedKFold(n_splits=5, random_state=0, shuffle=True)
+    fold_cache = utils.FoldCache(skf, X, y, ["a", "b"])
+    weights = np.linspace(0.5, 1.5, 8)
+    objectives = ["auroc", "demographic_parity_difference"]
+
+    serial = utils.cross_val_scorer(weights, skf, DecisionTreeClassifier(random_state=0), X, y, ["a", "b"], objectives, fold_cache=fold_cache)
+    with utils.make_executor(2, backend) as executor:
+        parallel = utils.cross_val_scorer(weights, skf, DecisionTreeClassifier(random_state=0), X, y, ["a", "b"], objectives,
+                                          fold_cache=fold_cache, executor=executor)
+    assert parallel == serial
+
+
+def test_process_pool_ships_fold_cache_by_key():
+    utils = pytest.importorskip("utils")
+    import pickle
+    from functools import partial
+    from sklearn.model_selection import StratifiedKFold
+    from sklearn.tree import DecisionTreeClassifier
+
+    X, y = _toy_task()
+    skf = StratifiedKFold(n_splits=5, random_state=0, shuffle=True)
+    fold_cache = utils.FoldCache(skf, X, y, ["a", "b"])
+    objectives = ["accuracy", "demographic_parity_difference"]
+    fitness = partial(utils.fitness_func_kfold, skf=skf, model=DecisionTreeClassifier(random_state=0), X_train=None, y_train=None,
+                      sens_features=["a", "b"], objective_functions=objectives, objective_functions_weights=[1, -1], fold_cache=fold_cache)
+    genomes = [np.linspace(0.5, 1.5, 8), np.ones(8)]
+    serial = [fitness(genome) for genome in genomes]
+    full_size = len(pickle.dumps(fold_cache))
+
+    executor = utils.make_executor(2, "process", fold_cache)
+    try:
+        assert len(pickle.dumps(fold_cache)) < full_size / 10
+        assert list(executor.map(fitness, genomes)) == serial
+        parallel = utils.cross_val_scorer(genomes[0], skf, DecisionTreeClassifier(random_state=0), X, y, ["a", "b"], objectives,
+                                          fold_cache=fold_cache, executor=executor)
+        assert parallel == (serial[0][0], -serial[0][1])
+    finally:
+        executor.shutdown()
+    # pickles in full again once the pool is gone
+    assert len(pickle.dumps(fold_cache)) == full_size
+
+
+def test_racing_evaluator_matches_kfold_and_stops_dominated():
+    utils = pytest.importorskip("utils")
+    from sklearn.model_selection import StratifiedKFold
+    from sklearn.tree import DecisionTreeClassifier
+
+    X, y = _toy_task()
+    skf = StratifiedKFold(n_splits=5, random_state=0, shuffle=True)
+    fold_cache = utils.FoldCache(skf, X, y, ["a", "b"])
+    weights = np.linspace(0.5, 1.5, 8)
+    objectives = ["accuracy", "demographic_parity_difference"]
+    racing = utils.RacingEvaluator(DecisionTreeClassifier(random_state=0), fold_cache, ["a", "b"], objectives, [1, -1], min_folds=2)
+
+    # without a reference front every fold is scored
+    full = utils.fitness_func_kfold(weights, skf, DecisionTreeClassifier(random_state=0), X, y, ["a", "b"], objectives, [1, -1], fold_cache=fold_cache)
+    assert racing(weights) == (*full, 1.0)
+
+    # a front that dominates every possible score stops the race after min_folds
+    racing.update_front([[2.0, 1.0]])
+    *partial, fidelity = racing(weights)
+    assert fidelity == 2 / 5
+    assert racing.dominated(np.array(partial))
+
+    # a front that dominates nothing never stops it
+    racing.update_front([[-1.0, -2.0]])
+    assert racing(weights)[-1] == 1.0
+
+
+def test_auroc_matches_sklearn_with_ties():
+    utils = pytest.importorskip("utils")
+    from sklearn.metrics import roc_auc_score
+
+    rng = np.random.default_rng(5)
+    y = rng.integers(0, 2, size=200)
+    y_score = rng.integers(0, 10, size=200) / 10
+
+    assert utils.auroc(y, y_score) == pytest.approx(roc_auc_score(y, y_score), rel=1e-12)
+
+
+def test_score_objective_functions_nan_probabilities_use_hard_predictions():
+    utils = pytest.importorskip("utils")
+    y = np.array([0, 1, 1, 0])
+    y_proba = np.array([[0.9, 0.1], [0.2, 0.8], [np.nan, np.nan], [0.4, 0.6]])
+
+    scores = utils.score_objective_functions(y, y_proba, np.array([0, 1]), ["auroc", "accuracy"])
+
+    # hard predictions are [0, 1, 0, 1]
+    assert scores["accuracy"] == 0.5
+    assert scores["auroc"] == 0.5
+
+
+def test_split_cache_round_trip(tmp_path):
+    utils = pytest.importorskip("utils")
+    X, y = _toy_task(n=20)
+    X_train, X_test = X.iloc[:15], X.iloc[15:]
+    y_train, y_test = y.iloc[:15], y.iloc[15:]
+    cache_path = str(tmp_path / "toy")
+
+    utils.save_split_cache(cache_path, X_train, y_train, X_test, y_test, X.columns, ["a", "b"])
+    loaded = utils.load_split_cache(cache_path)
+
+    pd.testing.assert_frame_equal(loaded[0], X_train)
+    pd.testing.assert_series_equal(loaded[1], y_train)
+    pd.testing.assert_frame_equal(loaded[2], X_test)
+    pd.testing.assert_series_equal(loaded[3], y_test)
+    assert loaded[5] == ["a", "b"]
+
+
+def test_split_cache_key_changes_with_source(tmp_path):
+    utils = pytest.importorskip("utils")
+    source = tmp_path / "toy_True.pkl"
+    source.write_bytes(b"first")
+    key = utils.split_cache_key(str(source), 0.2, 0)
+
+    assert utils.split_cache_key(str(source), 0.2, 1) != key
+    source.write_bytes(b"second")
+    assert utils.split_cache_key(str(source), 0.2, 0) != key
@@ -9,17 +9,24 @@ import numpy as np
 import pandas as pd
 from functools import partial
 from deap.tools._hypervolume import pyhv
-import collections
 from xgboost import XGBClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.model_selection import StratifiedKFold
-def makehash():
-    return collections.defaultdict(makehash)
 from sklearn.utils.validation import check_is_fitted
 from sklearn.exceptions import NotFittedError
+from sklearn.base import clone
 
 from fairlearn.metrics import demographic_parity_difference as dpd
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from typing import Iterator
+import itertools
+import os
+import pickle
+import shutil
+import hashlib
+import tempfile
+
+import instrumentation
 
 
 def FPR(y_true, y_pred):
@@ -99,92 +106,463 @@ def subgroup_loss(y_true, y_pred, X_protected, metric):
 
     return max_loss
 
-def subgroup_FNR_loss(X, y, y_pred, sens_features):
+def encode_groups(X_protected, dropna=True):
+    """Encode the intersectional groups of X_protected as integer codes.
+
+    Groups are numbered in the same (sorted) order as `X_protected.groupby(columns)`.
+    With dropna=True, rows with a missing sensitive value get code -1, since groupby
+    drops them too; with dropna=False they form groups of their own.
+
+    Returns
+    -------
+    codes: np.ndarray of int64, one code per row.
+    n_groups: int, number of distinct groups.
+    """
+    assert isinstance(X_protected, pd.DataFrame), "X should be a dataframe"
+    codes = X_protected.groupby(list(X_protected.columns), sort=True, dropna=dropna).ngroup().to_numpy(dtype=np.int64)
+    n_groups = int(codes.max()) + 1 if len(codes) > 0 else 0
+    return codes, n_groups
+
+def subgroup_loss_from_codes(y_true, y_pred, group_codes, metric, n_groups=None):
+    """NumPy version of subgroup_loss for metric='FPR' or 'FNR'.
+
+    Every group's loss and gamma are computed in a single np.bincount pass over the
+    integer group codes from encode_groups, instead of one pandas lookup per group.
+    The codes may come from a superset of the rows (e.g. a whole training split
+    scored fold by fold); groups without rows here are ignored, as groupby would.
+    For hard (0/1) predictions the result is bit-identical to subgroup_loss.
+    """
+    if metric not in ('FPR', 'FNR'):
+        raise ValueError(f"metric={metric} must be 'FPR' or 'FNR'")
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    group_codes = np.asarray(group_codes)
+    assert len(y_true) == len(y_pred) == len(group_codes), "y_true, y_pred and group_codes must have the same length."
+    if n_groups is None:
+        n_groups = int(group_codes.max()) + 1 if len(group_codes) > 0 else 0
+
+    n = len(group_codes)
+    in_group = group_codes >= 0
+    codes = group_codes[in_group]
+    yt = y_true[in_group].astype(bool)
+    yp = y_pred[in_group].astype(float)
+
+    if metric == 'FPR':
+        base_loss = FPR(y_true, y_pred)
+        cond = ~yt
+        errors = yp
+    else:
+        base_loss = FNR(y_true, y_pred)
+        cond = yt
+        errors = 1 - yp
+
+    # per-group size, number of positives, conditioning count and summed error
+    group_size = np.bincount(codes, minlength=n_groups)
+    n_pos = np.bincount(codes, weights=yt.astype(float), minlength=n_groups)
+    n_cond = np.bincount(codes, weights=cond.astype(float), minlength=n_groups)
+    err_sum = np.bincount(codes[cond], weights=errors[cond], minlength=n_groups)
+
+    # groups without any conditioning rows have a loss of zero, as in FPR/FNR
+    category_loss = np.divide(err_sum, n_cond, out=np.zeros(n_groups), where=n_cond > 0)
+    # for FPR and FNR, gamma is also conditioned on the outcome probability
+    g = 1 - n_pos/n if metric == 'FPR' else n_pos/n
+    deviation = g * np.abs(category_loss - base_loss)
+
+    # codes may be shared with a larger dataset, so skip groups absent from these rows
+    deviation = deviation[group_size > 0]
+    return max(0.0, deviation.max()) if len(deviation) > 0 else 0.0
+
+def subgroup_FNR_loss(X, y, y_pred, sens_features, group_codes=None):
+    """Subgroup FNR loss of y_pred over the intersectional groups of sens_features.
+
+    group_codes: optional precomputed output of encode_groups(X[sens_features]),
+    so that callers scoring the same rows repeatedly only encode the groups once.
+    """
     # Since it would be used as a scorer, we will assume est is already fitted
-    X_prime = X.loc[:, sens_features] 
-    
-    # Both y_val and y_proba should be pd.Series; Also checks whether they are 1D and have the same length as X_prime
-    if not isinstance(y, pd.Series):
-        y = pd.Series(y, index=X_prime.index)
-    if not isinstance(y_pred, pd.Series):
-        y_pred = pd.Series(y_pred, index=X_prime.index)
-    return subgroup_loss(y, y_pred, X_prime, 'FNR')
+    if group_codes is None:
+        group_codes, n_groups = encode_groups(X.loc[:, sens_features])
+    else:
+        n_groups = None
+    assert len(group_codes) == len(y) == len(y_pred), "X, y and y_pred must have the same length."
+    return subgroup_loss_from_codes(y, y_pred, group_codes, 'FNR', n_groups)
+
 
+def demographic_parity_difference_from_codes(y_pred, group_codes, n_groups=None):
+    """Returns the demographic parity difference computed from integer group codes.
+
+    Per-group selection rates (fraction of y_pred == 1) are computed with np.bincount,
+    and the difference between the largest and smallest rate is returned, as fairlearn's
+    demographic_parity_difference does with method='between_groups'.
+    """
+    y_pred = np.asarray(y_pred)
+    group_codes = np.asarray(group_codes)
+    assert len(y_pred) == len(group_codes), "y_pred and group_codes must have the same length."
+    if len(y_pred) == 0:
+        raise ValueError("Empty y_pred passed to demographic_parity_difference.")
+    if n_groups is None:
+        n_groups = int(group_codes.max()) + 1
+
+    group_size = np.bincount(group_codes, minlength=n_groups)
+    n_selected = np.bincount(group_codes, weights=(y_pred == 1).astype(float), minlength=n_groups)
+    present = group_size > 0
+    selection_rate = n_selected[present] / group_size[present]
+
+    return selection_rate.max() - selection_rate.min()
+
+def demographic_parity_difference(y_true, y_pred, X, sens_features, group_codes=None, use_fairlearn=False):
+    """Returns the demographic parity difference.
+
+    group_codes: optional precomputed output of encode_groups(X[sens_features], dropna=False).
+    use_fairlearn: if True, compute the metric with fairlearn on concatenated group strings
+    instead of the vectorized implementation; kept for cross-checking.
+    """
+    if group_codes is not None and not use_fairlearn:
+        return demographic_parity_difference_from_codes(y_pred, group_codes)
 
-def demographic_parity_difference(y_true, y_pred, X, sens_features):
-    """Returns the demographic parity difference."""
-    # Concatenate the values in sensitive features into a single list of strings
     if not all(col in X.columns for col in sens_features):
         raise ValueError("All elements in sens_features must be column names in X.")
     X_sensitive = X[sens_features]
-    sf_data = X_sensitive.apply(lambda row: ''.join(row.astype(str)), axis=1).tolist()
 
-    return dpd(y_true, y_pred, sensitive_features=sf_data)
+    if use_fairlearn:
+        # Concatenate the values in sensitive features into a single list of strings
+        sf_data = X_sensitive.apply(lambda row: ''.join(row.astype(str)), axis=1).tolist()
+        return dpd(y_true, y_pred, sensitive_features=sf_data)
+
+    group_codes, n_groups = encode_groups(X_sensitive, dropna=False)
+    return demographic_parity_difference_from_codes(y_pred, group_codes, n_groups)
 
 def binary_to_decimal(list_of_nums):
     list_of_nums = [str(int(x)) for x in list_of_nums]
     decimal_value = int(''.join(list_of_nums), 2)
     return decimal_value
 
-def partial_to_full_sample_weight(partial_weights: np.ndarray, X, y, sens_features):
+def cell_index(X, y, sens_features):
+    """Returns the (group, label) cell of each row as an integer array.
+
+    The binary sensitive columns followed by the target are bit-packed, most significant
+    bit first, exactly as binary_to_decimal does row by row. The cells of a training split
+    never change during a run, so this can be computed once and reused for every genome.
+    """
     assert y.index.equals(X.index), "Indices of y and sensitive_columns do not match."
-    sensitive_columns = X.loc[:, sens_features]
-    sensitive_columns['target'] = y
-    all_indices= sensitive_columns[sens_features+['target']].apply(binary_to_decimal, axis=1)
-    all_indices = all_indices.to_numpy()
-    return np.array(partial_weights[all_indices])
+    bits = np.column_stack([X.loc[:, sens_features].to_numpy(), y.to_numpy()])
+    if not np.isin(bits, (0, 1)).all():
+        raise ValueError("All sensitive features and the target must be binary.")
+    bits = bits.astype(np.int64)
+
+    cells = np.zeros(len(bits), dtype=np.int64)
+    for j in range(bits.shape[1]):
+        cells = 2*cells + bits[:, j]
+    return cells
 
-def cross_val_scorer(sample_weight, skf: sklearn.model_selection.StratifiedKFold, model, X, y, sens_features, objective_functions):
+def partial_to_full_sample_weight(partial_weights: np.ndarray, X, y, sens_features, cell_idx=None):
+    '''
+    Expands per-cell weights to one weight per row of X.
+
+    cell_idx: optional precomputed output of cell_index(X, y, sens_features)
+    '''
+    with instrumentation.timer('weights.expand'):
+        if cell_idx is None:
+            cell_idx = cell_index(X, y, sens_features)
+        return np.asarray(partial_weights)[cell_idx]
+
+class Fold:
+    """Train/test arrays of a single cross-validation fold, see FoldCache."""
+
+    def __init__(self, train_index, test_index, X_train, X_test, y_train, y_test, train_cells, test_group_codes, test_parity_codes):
+        self.train_index = train_index
+        self.test_index = test_index
+        self.X_train = X_train
+        self.X_test = X_test
+        self.y_train = y_train
+        self.y_test = y_test
+        self.train_cells = train_cells
+        self.test_group_codes = test_group_codes
+        self.test_parity_codes = test_parity_codes
+
+
+class FoldCache:
+    def __init__(self, skf: sklearn.model_selection.StratifiedKFold, X, y, sens_features, cell_idx=None):
+        """
+        Cross-validation folds of (X, y) materialized once for a whole GA run.
+
+        The folds of skf are fixed for a given (dataset, seed, n_splits), so the contiguous
+        NumPy train/test matrices, labels, sensitive group codes and (group, label) cell
+        indices of every fold are built here once, instead of re-indexing X and y for
+        every individual evaluation.
+
+        Parameters
+        ----------
+        skf : StratifiedKFold
+            Splitter with a fixed random_state.
+        X : pd.DataFrame
+            Training features.
+        y : pd.Series
+            Training labels, with the same index as X.
+        sens_features : list
+            Names of the sensitive columns of X.
+        cell_idx : np.ndarray, optional
+            Precomputed output of cell_index(X, y, sens_features). Computed here if the
+            sensitive features are binary; otherwise folds have no cells and only
+            unweighted fits are possible.
+        """
+        assert y.index.equals(X.index), "Indices of y and X do not match."
+        self.sens_features = sens_features
+        self.n_splits = skf.get_n_splits(X, y)
+
+        if cell_idx is None and np.isin(X.loc[:, sens_features].to_numpy(), (0, 1)).all():
+            cell_idx = cell_index(X, y, sens_features)
+        self.cell_idx = cell_idx
+
+        group_codes, self.n_groups = encode_groups(X.loc[:, sens_features])
+        parity_codes, self.n_parity_groups = encode_groups(X.loc[:, sens_features], dropna=False)
+        X_values = X.to_numpy()
+        y_values = y.to_numpy()
+
+        self.folds = []
+        for train_index, test_index in skf.split(X, y):
+            self.folds.append(Fold(
+                train_index=train_index,
+                test_index=test_index,
+                X_train=np.ascontiguousarray(X_values[train_index]),
+                X_test=np.ascontiguousarray(X_values[test_index]),
+                y_train=y_values[train_index],
+                y_test=y_values[test_index],
+                train_cells=None if cell_idx is None else cell_idx[train_index],
+                test_group_codes=group_codes[test_index],
+                test_parity_codes=parity_codes[test_index],
+            ))
+
+    def __len__(self):
+        return len(self.folds)
+
+    def __iter__(self):
+        return iter(self.folds)
+
+    def __reduce_ex__(self, protocol):
+        # inside a process pool built by make_executor(..., fold_cache=self), tasks only carry
+        # a key into the copy every worker loaded at startup, not the fold matrices
+        key = getattr(self, '_shared_key', None)
+        if key is not None and _shared_fold_caches.get(key) is self:
+            return _shared_fold_cache, (key,)
+        return super().__reduce_ex__(protocol)
+
+
+# FoldCaches installed in the workers of the process pools of make_executor, by key; the
+# parent registers its own instances too, so they pickle by key while their pool is open
+_shared_fold_caches = {}
+_shared_keys = itertools.count()
+
+
+def _shared_fold_cache(key):
+    return _shared_fold_caches[key]
+
+
+def _install_fold_cache(key, state):
+    fold_cache = FoldCache.__new__(FoldCache)
+    fold_cache.__dict__.update(state)
+    _shared_fold_caches[key] = fold_cache
+
+
+class _FoldCacheProcessPool(ProcessPoolExecutor):
+    """ProcessPoolExecutor whose workers load one FoldCache once, at startup."""
+
+    def __init__(self, max_workers, fold_cache):
+        self.fold_cache_key = (os.getpid(), next(_shared_keys))
+        state = {k: v for k, v in fold_cache.__dict__.items() if k != '_shared_key'}
+        super().__init__(max_workers=max_workers, initializer=_install_fold_cache, initargs=(self.fold_cache_key, state))
+        fold_cache._shared_key = self.fold_cache_key
+        _shared_fold_caches[self.fold_cache_key] = fold_cache
+
+    def shutdown(self, *args, **kwargs):
+        super().shutdown(*args, **kwargs)
+        fold_cache = _shared_fold_caches.pop(self.fold_cache_key, None)
+        if fold_cache is not None:
+            fold_cache.__dict__.pop('_shared_key', None)
+
+
+def make_executor(n_jobs, backend='thread', fold_cache=None):
+    '''
+    Returns a concurrent.futures executor with n_jobs workers, for use as the executor
+    argument of cross_val_scorer and fitness_func_kfold, or of the GA.
+
+    backend: 'thread' (fine for learners that release the GIL, e.g. XGBoost or
+             RandomForest) or 'process' (anything picklable)
+    fold_cache: FoldCache of the run, process backend only. Every worker loads it once at
+                startup, and while the pool is open the tasks that reference it (fitness
+                functions, RacingEvaluator, the folds of cross_val_scorer) only ship its key.
+                Shut the pool down at the end of the run.
+    '''
+    if backend == 'thread':
+        return ThreadPoolExecutor(max_workers=n_jobs)
+    elif backend == 'process':
+        if fold_cache is None:
+            return ProcessPoolExecutor(max_workers=n_jobs)
+        return _FoldCacheProcessPool(n_jobs, fold_cache)
+    else:
+        raise ValueError(f"backend={backend} must be 'thread' or 'process'")
+
+def _fit_and_score_fold(model, fold, sample_weight, objective_functions, sens_features):
+    instrumentation.count('cv.folds')
+    if sample_weight is not None:
+        with instrumentation.timer('weights.expand'):
+            fold_weight = sample_weight[fold.train_cells]
+        with instrumentation.timer('model.fit'):
+            model.fit(sample_weight=fold_weight, X=fold.X_train, y=fold.y_train)
+    else:
+        with instrumentation.timer('model.fit'):
+            model.fit(X=fold.X_train, y=fold.y_train)
+    scores = evaluate_objective_functions(model, fold.X_test, fold.y_test, objective_functions, sens_features,
+                                          group_codes=fold.test_group_codes, parity_codes=fold.test_parity_codes)
+    return scores[objective_functions[0]], scores[objective_functions[1]]
+
+def _fit_and_score_cached_fold(model, fold_cache, i, sample_weight, objective_functions, sens_features):
+    # fold_cache pickles by key in the pools of make_executor, so only the index travels
+    return _fit_and_score_fold(model, fold_cache.folds[i], sample_weight, objective_functions, sens_features)
+
+def cross_val_scorer(sample_weight, skf: sklearn.model_selection.StratifiedKFold, model, X, y, sens_features, objective_functions, cell_idx=None, fold_cache=None, executor=None):
     '''
     model: fitted model or pipeline
     sen_features: list of sensitive features
     objective_functions: list of objective functions
+    cell_idx: optional precomputed output of cell_index(X, y, sens_features)
+    fold_cache: optional FoldCache of skf over (X, y); built on the fly if not given
+    executor: optional concurrent.futures executor (see make_executor); if given, folds are
+              fitted concurrently. Results are collected in fold order, so the means match
+              the serial run whenever model has a fixed random_state.
+    model itself is never fitted, only clones of it, so one instance can be shared by
+    individuals evaluated concurrently.
     '''
+    if fold_cache is None:
+        fold_cache = FoldCache(skf, X, y, sens_features, cell_idx)
     if sample_weight is not None:
-        sample_weights_full = partial_to_full_sample_weight(sample_weight, X, y, sens_features)
+        if fold_cache.cell_idx is None:
+            raise ValueError("Sample weights per (group, label) cell require binary sensitive features.")
+        sample_weight = np.asarray(sample_weight)
     
     assert len(objective_functions) == 2, "Only two objective functions are supported this function."
-    obj0_vals = []
-    obj1_vals = []
-    cv_splits  = skf.split(X, y)
-    for train_index, test_index in cv_splits:
-        X_train, X_test = X.iloc[train_index], X.iloc[test_index]
-        y_train, y_test = y.iloc[train_index], y.iloc[test_index]
-
-        if sample_weight is not None:
-            model.fit(sample_weight=sample_weights_full[train_index], X=X_train, y=y_train)
-        else:
-            model.fit(X=X_train, y=y_train)
-        scores = evaluate_objective_functions(model, X_test, y_test, objective_functions, sens_features)
+    if executor is None:
+        fold_model = clone(model)
+        fold_scores = [_fit_and_score_fold(fold_model, fold, sample_weight, objective_functions, sens_features) for fold in fold_cache]
+    else:
+        futures = [executor.submit(_fit_and_score_cached_fold, clone(model), fold_cache, i, sample_weight, objective_functions, sens_features)
+                   for i in range(len(fold_cache))]
+        fold_scores = [future.result() for future in futures]
 
-        obj0_vals.append(scores[objective_functions[0]])
-        obj1_vals.append(scores[objective_functions[1]])
+    obj0_vals = [score[0] for score in fold_scores]
+    obj1_vals = [score[1] for score in fold_scores]
 
-    assert len(obj0_vals) == skf.get_n_splits(X,y), "Number of folds do not match."
-    assert len(obj1_vals) == skf.get_n_splits(X,y), "Number of folds do not match."
+    assert len(obj0_vals) == fold_cache.n_splits, "Number of folds do not match."
+    assert len(obj1_vals) == fold_cache.n_splits, "Number of folds do not match."
     return np.mean(obj0_vals), np.mean(obj1_vals)
 
-def fitness_func_kfold(sample_weight, skf: sklearn.model_selection.StratifiedKFold, model, X_train, y_train, sens_features, objective_functions, objective_functions_weights):
+def fitness_func_kfold(sample_weight, skf: sklearn.model_selection.StratifiedKFold, model, X_train, y_train, sens_features, objective_functions, objective_functions_weights, cell_idx=None, fold_cache=None, executor=None):
     '''
     model: fittend model or pipeline
     sen_features: list of senstive features
     objective_functions: list of objective functions
     objective_functions_weights: list of weights for each objective function
+    cell_idx: optional precomputed output of cell_index(X_train, y_train, sens_features)
+    fold_cache: optional FoldCache of skf over (X_train, y_train), shared by all individuals
+    executor: optional executor to fit the folds concurrently, see cross_val_scorer
     '''
-    cv_scores = cross_val_scorer(sample_weight, skf, model, X_train, y_train, sens_features, objective_functions)
+    cv_scores = cross_val_scorer(sample_weight, skf, model, X_train, y_train, sens_features, objective_functions, cell_idx, fold_cache, executor)
     return cv_scores[0]*objective_functions_weights[0], cv_scores[1]*objective_functions_weights[1]
 
 
-def fitness_func_holdout(sample_weight, model, X_train, y_train, X_val, y_val, sens_features, objective_functions, objective_functions_weights):
+class RacingEvaluator:
+    # the GA splits the trailing fidelity value off every fitness this returns
+    reports_fidelity = True
+
+    def __init__(self, model, fold_cache, sens_features, objective_functions, objective_functions_weights, min_folds=3, z=1.96):
+        """
+        Multi-fidelity drop-in for fitness_func_kfold that races the folds of fold_cache.
+
+        Folds are scored one at a time. From min_folds on, the optimistic bound
+        mean + z * standard error of the weighted per-fold scores is compared with the
+        reference front set by update_front; once a point of that front dominates the
+        bound, the remaining folds are skipped and the partial mean is returned. Without
+        a reference front every individual gets all folds, and the result equals
+        fitness_func_kfold.
+
+        Calling it returns the weighted objectives followed by the fidelity, i.e. the
+        fraction of folds that were scored (1.0 for a full estimate).
+
+        Parameters
+        ----------
+        model : estimator
+            Unfitted model; only clones of it are fitted.
+        fold_cache : FoldCache
+            Cross-validation folds of the training data.
+        sens_features : list
+            Names of the sensitive columns.
+        objective_functions : list
+            The two objective functions.
+        objective_functions_weights : list
+            Weight of each objective, so that every weighted objective is maximized.
+        min_folds : int, optional
+            Number of folds scored before a candidate can be stopped.
+        z : float, optional
+            Width of the confidence bound in standard errors.
+        """
+        assert len(objective_functions) == 2, "Only two objective functions are supported this function."
+        assert 2 <= min_folds, "The standard error needs at least two folds."
+        self.model = model
+        self.fold_cache = fold_cache
+        self.sens_features = sens_features
+        self.objective_functions = objective_functions
+        self.objective_functions_weights = np.asarray(objective_functions_weights, dtype=float)
+        self.min_folds = min_folds
+        self.z = z
+        self.front = None
+
+    def update_front(self, front_scores):
+        """Sets the (k, 2) weighted scores of the full-fidelity first front to race against."""
+        front_scores = None if front_scores is None else np.asarray(front_scores, dtype=float).reshape(-1, 2)
+        self.front = front_scores if front_scores is not None and len(front_scores) > 0 else None
+
+    def dominated(self, bound):
+        """True if a point of the reference front dominates bound (both maximized)."""
+        if self.front is None:
+            return False
+        return bool(np.any(np.all(self.front >= bound, axis=1) & np.any(self.front > bound, axis=1)))
+
+    def __call__(self, sample_weight):
+        if sample_weight is not None:
+            if self.fold_cache.cell_idx is None:
+                raise ValueError("Sample weights per (group, label) cell require binary sensitive features.")
+            sample_weight = np.asarray(sample_weight)
+
+        fold_model = clone(self.model)
+        fold_scores = []
+        for fold in self.fold_cache:
+            fold_scores.append(_fit_and_score_fold(fold_model, fold, sample_weight, self.objective_functions, self.sens_features))
+            k = len(fold_scores)
+            if self.min_folds <= k < self.fold_cache.n_splits:
+                weighted = np.array(fold_scores, dtype=float) * self.objective_functions_weights
+                bound = weighted.mean(axis=0) + self.z * weighted.std(axis=0, ddof=1) / np.sqrt(k)
+                if self.dominated(bound):
+                    break
+
+        # same reduction as cross_val_scorer, so full-fidelity results match fitness_func_kfold
+        obj0 = np.mean([score[0] for score in fold_scores])
+        obj1 = np.mean([score[1] for score in fold_scores])
+        fidelity = len(fold_scores) / self.fold_cache.n_splits
+        return obj0*self.objective_functions_weights[0], obj1*self.objective_functions_weights[1], fidelity
+
+
+def fitness_func_holdout(sample_weight, model, X_train, y_train, X_val, y_val, sens_features, objective_functions, objective_functions_weights, cell_idx=None):
     '''
     model: fittend model or pipeline
     sen_features: list of senstive features
     objective_functions: list of objective functions
     objective_functions_weights: list of weights for each objective function
+    cell_idx: optional precomputed output of cell_index(X_train, y_train, sens_features)
     '''
     
-    sample_weights_full = partial_to_full_sample_weight(sample_weight, X_train, y_train, sens_features)
+    sample_weights_full = partial_to_full_sample_weight(sample_weight, X_train, y_train, sens_features, cell_idx)
 
+    # fit a clone, so one model instance can be shared by individuals evaluated concurrently
+    model = clone(model)
     model.fit(sample_weight=sample_weights_full, X=X_train, y=y_train)
 
     scores = evaluate_objective_functions(model, X_val, y_val, objective_functions, sens_features)
@@ -198,43 +576,31 @@ def calc_weights(X, y, sens_features_name):
            Systems, 2012.
            
            Generalizes to any number of sensitive features and any number of
-           levels within each feature.
+           levels within each feature, and to any number of classes in y.
 
-         Note that the code works only when all sensitive features and y are binary.
+         The (group, label) table is built with np.bincount over integer cell codes,
+         and each row's weight, expected/observed count of its cell, is gathered from it.
+         Returns an np.ndarray with one weight per row of X.
     ''' 
-    
-    # combination of label and groups (outputs a table)
-    sens_features = X[sens_features_name] # grab features
-    outcome = y
-    tab = pd.DataFrame(pd.crosstab(index=[X[sens_features_name[s]] for s in range(len(sens_features_name))], columns=outcome))
+    assert y.index.equals(X.index), "Indices of y and X do not match."
+
+    # integer code of each row's intersectional group and label
+    group_codes, n_groups = encode_groups(X[sens_features_name], dropna=False)
+    label_codes, labels = pd.factorize(y, sort=True)
+    n_labels = len(labels)
+
+    # combination of label and groups (group x label table of counts)
+    cells = group_codes*n_labels + label_codes
+    tab = np.bincount(cells, minlength=n_groups*n_labels).reshape(n_groups, n_labels)
 
-    # reweighing weights
-    w = makehash()
+    # reweighing weights; empty cells are never gathered, but avoid dividing by zero
     n = len(X)
-    for r in tab.index:
-        key1 = str(tuple(int(num) for num in r))
-        row_sum = tab.loc[r].sum(axis=0)
-        for c in tab.columns:
-            key2 = str(c)
-            col_sum = tab[c].sum()
-            if tab.loc[r,c] == 0:
-                n_combo = 1
-            else:
-                n_combo = tab.loc[r,c]
-            val = (row_sum*col_sum)/(n*n_combo)
-            w[key1][key2] = val
-    
-    # Instance weights
-    instance_weights = []
-    for index, row in X.iterrows():
-        features = []
-        for s in range(len(sens_features_name)):
-            features.append(int(row[sens_features_name[s]]))
-        out = y[index]
-        features = str(tuple(features))
-        instance_weights.append(w[features][str(out)])
+    row_sum = tab.sum(axis=1)
+    col_sum = tab.sum(axis=0)
+    w = (row_sum[:, None]*col_sum[None, :])/(n*np.maximum(tab, 1))
 
-    return instance_weights
+    # Instance weights
+    return w.ravel()[cells]
 
 def fairnes_metric(graph_pipeline, X, y, metric, X_prime):
     '''
@@ -245,10 +611,86 @@ def fairnes_metric(graph_pipeline, X, y, metric, X_prime):
     X_prime = X_prime.iloc[y.index]
     return metric(y, y_proba, X_prime, grouping = 'intersectional', abs_val = True, gamma = True)
 
-def load_task(data_dir, dataset_name, test_size, seed, preprocess=True):
+def preprocessing_pipeline():
+    return sklearn.pipeline.make_pipeline(tpot.builtin_modules.ColumnSimpleImputer("categorical", strategy='most_frequent'), tpot.builtin_modules.ColumnSimpleImputer("numeric", strategy='mean'), tpot.builtin_modules.ColumnOneHotEncoder("categorical", min_frequency=0.001, handle_unknown="ignore"))
+
+def split_cache_key(cached_data_path, test_size, seed):
+    '''
+    Content address of a preprocessed train/test split: a hash of the source pickle's bytes,
+    the split parameters, the preprocessing pipeline and the library versions it depends on.
+    '''
+    h = hashlib.sha256()
+    with open(cached_data_path,'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            h.update(chunk)
+    h.update(repr((test_size, seed, repr(preprocessing_pipeline()), tpot.__version__, sklearn.__version__, pd.__version__)).encode())
+    return h.hexdigest()
+
+def save_split_cache(cache_path, X_train, y_train, X_test, y_test, features, sens_features):
+    '''
+    Stores a preprocessed split under cache_path as .npy arrays plus a small metadata pickle.
+    The folder is written under a temporary name and renamed, so readers never see a partial
+    cache; if another worker wrote the same key first, its copy is kept.
+    '''
+    X_train_values, X_test_values = X_train.to_numpy(), X_test.to_numpy()
+    if X_train_values.dtype == object or X_test_values.dtype == object:
+        print(f"Not caching split with non-numeric features: {cache_path}")
+        return
+
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=cache_dir, prefix='.tmp_')
+    np.save(f"{tmp_path}/X_train.npy", X_train_values)
+    np.save(f"{tmp_path}/X_test.npy", X_test_values)
+    np.save(f"{tmp_path}/y_train.npy", y_train.to_numpy())
+    np.save(f"{tmp_path}/y_test.npy", y_test.to_numpy())
+    np.save(f"{tmp_path}/train_index.npy", X_train.index.to_numpy())
+    np.save(f"{tmp_path}/test_index.npy", X_test.index.to_numpy())
+    with open(f"{tmp_path}/meta.pkl", "wb") as f:
+        pickle.dump({'features': features, 'dtypes': X_train.dtypes, 'y_name': y_train.name, 'sens_features': sens_features}, f)
+
+    try:
+        os.rename(tmp_path, cache_path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+def load_split_cache(cache_path):
+    '''
+    Opens a split stored by save_split_cache; the feature matrices are memory-mapped read-only.
+    '''
+    with open(f"{cache_path}/meta.pkl", 'rb') as file:
+        meta = pickle.load(file)
+    features, dtypes = meta['features'], meta['dtypes']
+
+    def frame(name, index):
+        X = pd.DataFrame(np.load(f"{cache_path}/{name}.npy", mmap_mode='r'), index=index, columns=features, copy=False)
+        return X if X.dtypes.equals(dtypes) else X.astype(dtypes)
+
+    train_index = pd.Index(np.load(f"{cache_path}/train_index.npy"))
+    test_index = pd.Index(np.load(f"{cache_path}/test_index.npy"))
+    X_train = frame('X_train', train_index)
+    X_test = frame('X_test', test_index)
+    y_train = pd.Series(np.load(f"{cache_path}/y_train.npy"), index=train_index, name=meta['y_name'])
+    y_test = pd.Series(np.load(f"{cache_path}/y_test.npy"), index=test_index, name=meta['y_name'])
+
+    return X_train, y_train, X_test, y_test, features, meta['sens_features']
+
+def load_task(data_dir, dataset_name, test_size, seed, preprocess=True, cache_dir=None):
+    '''
+    cache_dir: optional folder for a persistent cache of preprocessed splits, keyed by
+               split_cache_key. A cached split is opened instead of re-splitting and
+               re-fitting the preprocessing pipeline; it is invalidated automatically when
+               the source pickle or the pipeline changes.
+    '''
     
     cached_data_path = f"{data_dir}/{dataset_name}_{preprocess}.pkl"
     print(cached_data_path)
+
+    if cache_dir is not None:
+        cache_path = f"{cache_dir}/{dataset_name}_{preprocess}_{split_cache_key(cached_data_path, test_size, seed)}"
+        if os.path.exists(cache_path):
+            print("Loading cached split", cache_path)
+            return load_split_cache(cache_path)
     
     with open(cached_data_path,'rb') as file:
         d = pd.read_pickle(file)
@@ -260,12 +702,12 @@ def load_task(data_dir, dataset_name, test_size, seed, preprocess=True):
     X_train_pre, y_train_pre = X_train_pre.sort_index(), y_train_pre.sort_index()
     X_test_pre, y_test_pre = X_test_pre.sort_index(), y_test_pre.sort_index()
 
-    preprocessing_pipeline = sklearn.pipeline.make_pipeline(tpot.builtin_modules.ColumnSimpleImputer("categorical", strategy='most_frequent'), tpot.builtin_modules.ColumnSimpleImputer("numeric", strategy='mean'), tpot.builtin_modules.ColumnOneHotEncoder("categorical", min_frequency=0.001, handle_unknown="ignore"))
-    X_train = preprocessing_pipeline.fit_transform(X_train_pre)
+    pipeline = preprocessing_pipeline()
+    X_train = pipeline.fit_transform(X_train_pre)
     X_train.index = X_train_pre.index
     y_train = pd.Series(y_train_pre, index=y_train_pre.index)
 
-    X_test = preprocessing_pipeline.transform(X_test_pre)
+    X_test = pipeline.transform(X_test_pre)
     X_test.index = X_test_pre.index
     y_test = pd.Series(y_test_pre, index=y_test_pre.index)
     
@@ -278,6 +720,9 @@ def load_task(data_dir, dataset_name, test_size, seed, preprocess=True):
     assert y_train.index.equals(X_train.index), "Indices of y_train and X_train do not match."
     assert y_test.index.equals(X_test.index), "Indices of y_test and X_test do not match."
 
+    if cache_dir is not None:
+        save_split_cache(cache_path, X_train, y_train, X_test, y_test, features, sens_features)
+
     return X_train, y_train, X_test, y_test, features, sens_features
 
 # PARETO FRONT TOOLS
@@ -300,62 +745,154 @@ def check_dominance(p1,p2):
         return 0
 
 
+def _nondominated_mask_2d(scores):
+    """Sort-and-sweep non-dominated filter for two minimized objectives, O(n log n).
+
+    A point survives if no earlier point in (obj1, obj2) order has a smaller or equal obj2,
+    and no point with the same obj1 has a smaller obj2. Duplicates do not dominate each other.
+    """
+    n = len(scores)
+    order = np.lexsort((scores[:, 1], scores[:, 0]))
+    s1, s2 = scores[order, 0], scores[order, 1]
+
+    # groups of points sharing the same obj1; the first of each group has its smallest obj2
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = s1[1:] != s1[:-1]
+    group_start = np.flatnonzero(new_group)
+    group_id = np.cumsum(new_group) - 1
+
+    # best obj2 among all points with a strictly smaller obj1
+    best_before = np.full(len(group_start), np.inf)
+    best_before[1:] = np.minimum.accumulate(s2)[group_start[1:] - 1]
+
+    # the first group has nothing before it, which also keeps an obj2 of +inf there
+    keep = (s2 == s2[group_start][group_id]) & ((group_id == 0) | (s2 < best_before[group_id]))
+    mask = np.zeros(n, dtype=bool)
+    mask[order[keep]] = True
+    return mask
+
+def _nondominated_mask_nd(scores, chunk_size=256):
+    """Broadcasted non-dominated filter for any number of minimized objectives.
+
+    Follows check_dominance exactly (including NaN, which is neither better nor worse),
+    comparing chunk_size points against the whole set at a time.
+    """
+    n = len(scores)
+    mask = np.zeros(n, dtype=bool)
+    for start in range(0, n, chunk_size):
+        p = scores[start:start + chunk_size, None, :]
+        better = (scores[None, :, :] < p).any(axis=2)
+        worse = (scores[None, :, :] > p).any(axis=2)
+        mask[start:start + chunk_size] = ~(better & ~worse).any(axis=1)
+    return mask
+
+def pareto_front(scores):
+    """return row indices of scores (n_points x n_objectives, minimized) on the Pareto front.
+
+    Uses a sort-and-sweep filter for two objectives without NaNs and a broadcasted
+    fallback otherwise. Indices are sorted by the second objective, as in front.
+    """
+    scores = np.asarray(scores, dtype=float)
+    assert scores.ndim == 2, "scores should be a 2D array of shape (n_points, n_objectives)."
+    if scores.shape[1] == 2 and not np.isnan(scores).any():
+        mask = _nondominated_mask_2d(scores)
+    else:
+        mask = _nondominated_mask_nd(scores)
+
+    front = np.flatnonzero(mask)
+    s2 = np.argsort(scores[front, 1 if scores.shape[1] > 1 else 0])
+    return [front[s] for s in s2]
+
 def front(obj1,obj2):
     """return indices from x and y that are on the Pareto front."""
-    rank = []
     assert(len(obj1)==len(obj2))
-    n_inds = len(obj1)
-    front = []
-
-    for i in np.arange(n_inds):
-        p = (obj1[i],obj2[i])
-        dcount = 0
-        dom = []
-        for j in np.arange(n_inds):
-            q = (obj1[j],obj2[j])
-            compare = check_dominance(p,q)
-            if compare == 1:
-                dom.append(j)
-            elif compare == -1:
-                dcount = dcount +1
-
-        if dcount == 0:
-            front.append(i)
-
-    f_obj2 = [obj2[f] for f in front]
-    s2 = np.argsort(np.array(f_obj2))
-    front = [front[s] for s in s2]
-
-    return front
-
-def evaluate_objective_functions(est, X, y,  objective_functions=None, sens_features=None):
+    return pareto_front(np.column_stack([np.asarray(obj1, dtype=float), np.asarray(obj2, dtype=float)]))
+
+def auroc(y_true, y_score):
+    """Rank-based (Mann-Whitney) area under the ROC curve, with tied scores getting their average rank.
+
+    y_true: array-like, bool
+        True labels.
+    y_score: array-like, float
+        Scores of the positive class; must not contain NaN.
+    """
+    y_true = np.asarray(y_true).astype(bool)
+    y_score = np.asarray(y_score, dtype=float)
+    if np.isnan(y_score).any():
+        raise ValueError("y_score contains NaN.")
+    n = len(y_true)
+    n_pos = int(np.sum(y_true))
+    n_neg = n - n_pos
+    if n_pos == 0 or n_neg == 0:
+        raise ValueError("Only one class present in y_true. ROC AUC score is not defined in that case.")
+
+    order = np.argsort(y_score, kind='mergesort')
+    sorted_scores = y_score[order]
+    # runs of tied scores share the average of the 1-based ranks they span
+    starts = np.flatnonzero(np.r_[True, sorted_scores[1:] != sorted_scores[:-1]])
+    ends = np.r_[starts[1:], n]
+    ranks = np.empty(n)
+    ranks[order] = np.repeat((starts + ends + 1)/2, ends - starts)
+
+    return (np.sum(ranks[y_true]) - n_pos*(n_pos + 1)/2)/(n_pos*n_neg)
+
+def score_objective_functions(y, y_proba, classes, objective_functions, group_codes=None, parity_codes=None):
+    '''
+    Computes all requested objectives from a single predict_proba buffer.
+
+    y: true labels
+    y_proba: (n_samples, n_classes) output of predict_proba
+    classes: the estimator's classes_; hard predictions are classes[argmax(y_proba)], as in predict
+    group_codes: encode_groups codes of the rows, required for subgroup_FNR_loss
+    parity_codes: encode_groups(dropna=False) codes of the rows, required for demographic_parity_difference
+    '''
+    y = np.asarray(y)
+    y_proba = np.asarray(y_proba)
+    y_pred = np.asarray(classes)[np.argmax(y_proba, axis=1)]
+
+    scores = {}
+    for obj in objective_functions:
+        with instrumentation.timer(f'objective.{obj}'):
+            if obj == 'subgroup_FNR_loss':
+                scores[obj] = subgroup_loss_from_codes(y, y_pred, group_codes, 'FNR')
+
+            elif obj == 'auroc':
+                y_score = y_proba[:, 1]
+                if np.isnan(y_score).any():
+                    # Sometimes predict_proba can give NaN values; score the hard predictions instead
+                    y_score = (y_pred == classes[1]).astype(float)
+                scores[obj] = auroc(y == classes[1], y_score)
+
+            elif obj == 'accuracy':
+                scores[obj] = np.mean(y_pred == y)
+
+            elif obj == 'demographic_parity_difference':
+                scores[obj] = demographic_parity_difference_from_codes(y_pred, parity_codes)
+
+            else:
+                raise ValueError(f"Objective function {obj} not recognized.")
+
+    return scores
+
+def evaluate_objective_functions(est, X, y,  objective_functions=None, sens_features=None, group_codes=None, parity_codes=None):
+    '''
+    Scores est on (X, y) with a single predict_proba call shared by all objectives.
+
+    group_codes: optional precomputed encode_groups(X[sens_features]) codes for subgroup_FNR_loss
+    parity_codes: optional precomputed encode_groups(X[sens_features], dropna=False) codes
+                  for demographic_parity_difference
+    With both given, X may be a NumPy array.
+    '''
     try:
         check_is_fitted(est)
     except NotFittedError as exc:
         print(f"Model is not fitted yet.")
-    scores = {}
-    for obj in objective_functions:
-        if obj == 'subgroup_FNR_loss':
-            scores[obj] = subgroup_FNR_loss(X, y, est.predict(X), sens_features)
-        
-        elif obj == 'auroc':
-            try:
-                this_auroc_score = sklearn.metrics.get_scorer("roc_auc")(est, X, y)
-            except:
-                # Sometimes predict_proba can give NaN values
-                y_preds = est.predict(X)
-                this_auroc_score = metrics.roc_auc_score(y, y_preds)
-            scores[obj] = this_auroc_score
-
-        elif obj == 'accuracy':
-            this_accuracy_score = sklearn.metrics.get_scorer("accuracy")(est, X, y)
-            scores[obj] = this_accuracy_score
-
-        elif obj == 'demographic_parity_difference':
-            y_pred = est.predict(X)
-            scores[obj] = demographic_parity_difference(y, y_pred, X, sens_features)
 
-        else:
-            raise ValueError(f"Objective function {obj} not recognized.")
+    if 'subgroup_FNR_loss' in objective_functions and group_codes is None:
+        group_codes, _ = encode_groups(X.loc[:, sens_features])
+    if 'demographic_parity_difference' in objective_functions and parity_codes is None:
+        parity_codes, _ = encode_groups(X.loc[:, sens_features], dropna=False)
 
-    return scores
\ No newline at end of file
+    with instrumentation.timer('model.predict'):
+        y_proba = est.predict_proba(X)
+    return score_objective_functions(y, y_proba, est.classes_, objective_functions, group_codes, parity_codes)